@@ -1,18 +1,26 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from app.config import Config
 from app.extensions import db, migrate, cors
-from app.routes.ask import ask_bp
-from app.routes.stats import stats_bp
-from app.routes.sitemap import sitemap_bp
-from app.routes.conversations import conversations_bp
+from app.services.profiler import request_profiler
 
 def create_app():
+    # Blueprints are imported here so that importing the app package (e.g. from
+    # scripts or benchmarks) does not load the embedding model and vectorstore
+    from app.routes.ask import ask_bp
+    from app.routes.stats import stats_bp
+    from app.routes.sitemap import sitemap_bp
+    from app.routes.conversations import conversations_bp
+
     app = Flask(__name__)
     app.config.from_object(Config)
+    if app.config["TRUSTED_PROXY_HOPS"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXY_HOPS"])
 
     db.init_app(app)
     migrate.init_app(app, db)
     cors.init_app(app)
+    request_profiler.init_app(app)
 
     app.register_blueprint(ask_bp)
     app.register_blueprint(conversations_bp)
@@ -20,4 +28,3 @@ def create_app():
     app.register_blueprint(sitemap_bp)
 
     return app
-
@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///data.db'
+    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", 'sqlite:///data.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-
+    # Number of reverse proxies in front of the app that add X-Forwarded-For
+    # (0 = clients connect directly, the header is ignored)
+    TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
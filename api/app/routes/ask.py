@@ -1,9 +1,16 @@
-from flask import Blueprint, request, jsonify
-from app.services.chat_service import get_or_create_chain, save_to_db, format_with_footnotes, detect_language
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from app.services.chat_service import get_or_create_chain, save_to_db, run_chain, answer_first_turn, persist_history, session_turn
+from app.services.language import detect_language
+from app.services.batch_service import answer_batch, BATCH_MAX_QUESTIONS
+from app.services.retrieval import known_scope_values, parse_scope
+from app.services.embedding_loader import vectorstore_holder
+from app.services.admission import BUSY_MESSAGE, admission_controlled, ask_gate, check_rate_limit, rejection_response
 
 ask_bp = Blueprint('ask', __name__)
 
 @ask_bp.route('/ask', methods=['POST'])
+@admission_controlled
 def ask():
     data = request.get_json()
     question = data.get("question")
@@ -13,15 +20,23 @@ def ask():
     if not question:
         return jsonify({"error": "Bitte gib eine Frage an."}), 400
 
-    language = detect_language(question).upper()
+    # Optional: search only specific documents/categories, e.g. {"category": "abkommen"}
+    try:
+        scope = parse_scope(data.get("scope"), known_scope_values(vectorstore_holder.get()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    session_id, conv = get_or_create_chain(session_id)
-    resp = conv({"question": question, "language": language})
-    raw_answer = resp.get("answer", "")
-    
-    # Extract unique sources from documents
-    source_docs = resp.get("source_documents", [])
-    answer, sources = format_with_footnotes(raw_answer, source_docs)
+    if session_id:
+        with session_turn(session_id):
+            session_id, conv, session_language = get_or_create_chain(session_id, scope)
+            # Short follow-ups keep the session's language unless clearly in another one
+            language = detect_language(question, session_language).upper()
+            _, answer, sources = run_chain(conv, question, language)
+            persist_history(session_id, conv, language)
+    else:
+        language = detect_language(question).upper()
+        # First turn: identical concurrent questions share one computation
+        session_id, answer, sources = answer_first_turn(question, language, scope)
    
     if skip_storage is False:
         # Save the question, answer, session_id, and sources to the database
@@ -32,3 +47,40 @@ def ask():
         "answer": answer,
         "sources": sources  # Add sources to response
     })
+
+@ask_bp.route('/ask/batch', methods=['POST'])
+def ask_batch():
+    """Answers many questions at once and streams the results as NDJSON."""
+    rejected = check_rate_limit()
+    if rejected is not None:
+        return rejected
+
+    data = request.get_json()
+    questions = data.get("questions") or []
+    skip_storage = data.get("skip_storage", False)
+
+    # A plain string would otherwise be answered character by character
+    if not questions or not isinstance(questions, list) or not all(isinstance(q, str) and q.strip() for q in questions):
+        return jsonify({"error": "Bitte gib eine Liste von Fragen an."}), 400
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return jsonify({"error": f"Maximal {BATCH_MAX_QUESTIONS} Fragen pro Anfrage."}), 400
+    try:
+        scope = parse_scope(data.get("scope"), known_scope_values(vectorstore_holder.get()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # A batch holds a request thread until the whole stream is sent, so it
+    # counts against the same limit as /ask and leaves threads for cheap routes
+    if not ask_gate.try_acquire():
+        return rejection_response(BUSY_MESSAGE, 503, 1)
+
+    def generate():
+        for result in answer_batch(questions, scope):
+            if skip_storage is False and "error" not in result:
+                save_to_db(result["question"], result["answer"], result["session_id"], result["sources"])
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    # Runs when the stream is finished or the client disconnects
+    response.call_on_close(ask_gate.release)
+    return response
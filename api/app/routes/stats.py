@@ -1,6 +1,12 @@
+import os
 from flask import Blueprint, jsonify
 from app.models import Message
 from app import db
+from app.services.chat_service import question_flight
+from app.services.admission import admission_stats
+from app.services.session_store import session_stats
+from app.services.embedding_loader import embedding_model, vectorstore_holder
+from app.services.language import language_cache_stats
 from sqlalchemy import func
 
 stats_bp = Blueprint('stats', __name__)
@@ -14,3 +20,16 @@ def get_stats():
 
     return jsonify([{"date": date, "count": count} for date, count in results])
 
+
+@stats_bp.route('/stats/runtime', methods=['GET'])
+def get_runtime_stats():
+    # Counters are per worker process, so the pid is included
+    return jsonify({
+        "pid": os.getpid(),
+        "index_version": vectorstore_holder.version,
+        "coalescing": question_flight.stats(),
+        "admission": admission_stats(),
+        "sessions": session_stats.stats(),
+        "language_cache": language_cache_stats(),
+        "embedding": embedding_model.stats(),
+    })
@@ -0,0 +1,239 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Tuple
+
+from flask import jsonify, request
+from openai import APITimeoutError
+
+# Max. LLM calls running at the same time per worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Max. requests waiting for an LLM slot per worker; more are rejected with 503
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "2"))
+# Max. seconds a request waits for an LLM slot
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+# Max. of those LLM slots used by batch requests; the rest stays for /ask
+LLM_BATCH_MAX_CONCURRENCY = int(os.getenv("LLM_BATCH_MAX_CONCURRENCY", str(max(1, LLM_MAX_CONCURRENCY // 2))))
+# Max. /ask requests handled at the same time per worker. Must be lower than
+# the gunicorn thread count so cheap routes (/feed, /stats, ...) always get a thread.
+ASK_MAX_ACTIVE = int(os.getenv("ASK_MAX_ACTIVE", "6"))
+# Per-client rate limit for /ask (token bucket)
+ASK_RATE_LIMIT_PER_MINUTE = float(os.getenv("ASK_RATE_LIMIT_PER_MINUTE", "20"))
+ASK_RATE_LIMIT_BURST = int(os.getenv("ASK_RATE_LIMIT_BURST", "5"))
+
+BUSY_MESSAGE = "Der Dienst ist gerade ausgelastet. Bitte versuche es in Kürze erneut."
+RATE_LIMIT_MESSAGE = "Zu viele Anfragen. Bitte versuche es in Kürze erneut."
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, status: int = 503, retry_after: float = 1.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class LLMAdmission:
+    """
+    Limits concurrent LLM calls with a bounded wait queue.
+
+    When all slots are taken, up to max_queue callers wait at most
+    queue_timeout seconds; everyone else is rejected immediately instead of
+    piling up behind a slow upstream.
+
+    slot(bounded=False) is for background work such as batch requests: it
+    waits for a slot without queue limit or timeout and does not take a place
+    in the interactive queue. Background work uses at most max_background
+    slots and only starts while no interactive caller is waiting, so a batch
+    leaves the remaining slots to interactive requests.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, max_background: int = 1):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        self._background = 0
+        self.max_background = max(1, min(max_background, max_concurrency))
+        self._stats = {"admitted": 0, "queued_total": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    @contextmanager
+    def slot(self, bounded: bool = True):
+        with self._cond:
+            if not bounded:
+                while (
+                    self._in_flight >= self.max_concurrency
+                    or self._background >= self.max_background
+                    or self._queued
+                ):
+                    self._cond.wait()
+                self._background += 1
+            elif self._in_flight >= self.max_concurrency:
+                if self._queued >= self.max_queue:
+                    self._stats["rejected_queue_full"] += 1
+                    raise AdmissionRejected("queue_full", 503, self.queue_timeout)
+
+                self._queued += 1
+                self._stats["queued_total"] += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self._in_flight >= self.max_concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["rejected_timeout"] += 1
+                            raise AdmissionRejected("queue_timeout", 503, self.queue_timeout)
+                        self._cond.wait(remaining)
+                finally:
+                    self._queued -= 1
+                    # Background waiters hold back while the queue is not empty
+                    self._cond.notify_all()
+
+            self._in_flight += 1
+            self._stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                if not bounded:
+                    self._background -= 1
+                # Wake all waiters: interactive ones have deadlines, and a
+                # single notify could go to a waiter that just timed out
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "background_in_flight": self._background,
+                "queue_depth": self._queued,
+                **self._stats,
+            }
+
+
+class ConcurrencyGate:
+    """Non-blocking limit on how many requests of one kind run at the same time."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._active = 0
+        self._rejected = 0
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self._active >= self.limit:
+                self._rejected += 1
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"active": self._active, "limit": self.limit, "rejected": self._rejected}
+
+
+class RateLimiter:
+    """Token bucket per client (per worker process)."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_clients: int = 10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._rejected = 0
+
+    def check(self, client: str) -> Tuple[bool, float]:
+        """Takes one token. Returns (allowed, seconds until the next token)."""
+        if self.rate <= 0:
+            return True, 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(client, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[client] = (tokens, now)
+                self._rejected += 1
+                return False, (1 - tokens) / self.rate
+            self._buckets[client] = (tokens - 1, now)
+            if len(self._buckets) > self.max_clients:
+                self._prune(now)
+            return True, 0.0
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely carry no state
+        full_after = self.burst / self.rate
+        self._buckets = {c: (t, last) for c, (t, last) in self._buckets.items() if now - last < full_after}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"clients": len(self._buckets), "rejected": self._rejected}
+
+
+llm_admission = LLMAdmission(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT, LLM_BATCH_MAX_CONCURRENCY)
+ask_gate = ConcurrencyGate(ASK_MAX_ACTIVE)
+rate_limiter = RateLimiter(ASK_RATE_LIMIT_PER_MINUTE, ASK_RATE_LIMIT_BURST)
+
+
+def client_id() -> str:
+    # Behind a reverse proxy, remote_addr is set from the proxy-added
+    # X-Forwarded-For entry by ProxyFix (TRUSTED_PROXY_HOPS); headers sent by
+    # the client itself are never trusted
+    return request.remote_addr or "unknown"
+
+
+def rejection_response(message: str, status: int, retry_after: float):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+def check_rate_limit():
+    """Returns a 429 response if the client is over its rate limit, else None."""
+    allowed, retry_after = rate_limiter.check(client_id())
+    if not allowed:
+        return rejection_response(RATE_LIMIT_MESSAGE, 429, retry_after)
+    return None
+
+
+def admission_controlled(view):
+    """
+    Applies the per-client rate limit and the per-worker /ask limit to a view
+    and turns AdmissionRejected (no LLM slot) into a fast 503.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        rejected = check_rate_limit()
+        if rejected is not None:
+            return rejected
+        if not ask_gate.try_acquire():
+            return rejection_response(BUSY_MESSAGE, 503, 1)
+        try:
+            return view(*args, **kwargs)
+        except AdmissionRejected as e:
+            return rejection_response(BUSY_MESSAGE, e.status, e.retry_after)
+        except APITimeoutError:
+            # Upstream LLM did not answer within LLM_TIMEOUT
+            return rejection_response(BUSY_MESSAGE, 503, LLM_QUEUE_TIMEOUT)
+        finally:
+            ask_gate.release()
+    return wrapper
+
+
+def admission_stats() -> dict:
+    return {
+        "llm": llm_admission.stats(),
+        "ask": ask_gate.stats(),
+        "rate_limit": rate_limiter.stats(),
+    }
@@ -0,0 +1,86 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+from uuid import uuid4
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.embedding_loader import embedding_model, vectorstore_holder
+from app.services.retrieval import SCOPED_RETRIEVAL_K, search_by_vectors
+from app.services.admission import LLM_BATCH_MAX_CONCURRENCY, llm_admission
+from app.services.language import detect_language
+from app.services.chat_service import (
+    RETRIEVAL_K,
+    add_default_source,
+    create_combine_docs_chain,
+    format_with_footnotes,
+)
+
+# Maximum number of questions per batch request
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+# Number of LLM calls running at the same time per batch; more than the batch
+# share of the LLM slots (LLM_BATCH_MAX_CONCURRENCY) would only wait
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(LLM_BATCH_MAX_CONCURRENCY)))
+
+
+def retrieve_batch(
+    questions: List[str],
+    scope: Optional[Dict[str, List[str]]] = None,
+) -> List[List[Document]]:
+    """
+    Retrieves the top-k documents for many questions at once.
+
+    All questions are embedded in one batched encoder call and searched with a
+    single FAISS matrix query instead of one forward pass and search per question.
+    """
+    vectors = np.asarray(embedding_model.embed_documents(questions), dtype=np.float32)
+    k = SCOPED_RETRIEVAL_K if scope else RETRIEVAL_K
+    return [add_default_source(docs) for docs in search_by_vectors(vectorstore_holder.get(), vectors, k, scope)]
+
+
+def answer_batch(
+    questions: List[str],
+    scope: Optional[Dict[str, List[str]]] = None,
+) -> Iterator[dict]:
+    """
+    Answers many history-free questions.
+
+    Yields one result per question in the same shape as /ask (plus the index of
+    the question in the request), in the order the answers complete.
+    """
+    languages = [detect_language(q).upper() for q in questions]
+    docs_per_question = retrieve_batch(questions, scope)
+    combine_docs_chain = create_combine_docs_chain()
+
+    def answer(i: int) -> dict:
+        # Waits for a free batch slot instead of being rejected, and yields to
+        # waiting /ask requests (see LLMAdmission)
+        with llm_admission.slot(bounded=False):
+            resp = combine_docs_chain.invoke({
+                "input_documents": docs_per_question[i],
+                "question": questions[i],
+                "language": languages[i],
+            })
+        answer, sources = format_with_footnotes(resp.get("output_text", ""), docs_per_question[i])
+        return {
+            "index": i,
+            "question": questions[i],
+            "session_id": str(uuid4()),
+            "answer": answer,
+            "sources": sources,
+        }
+
+    executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
+    try:
+        futures = {executor.submit(answer, i): i for i in range(len(questions))}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {"index": i, "question": questions[i], "error": str(e)}
+    finally:
+        # On a client disconnect the generator is closed here: drop the
+        # questions not started yet instead of answering them for nobody
+        executor.shutdown(wait=False, cancel_futures=True)
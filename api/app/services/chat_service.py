@@ -1,14 +1,23 @@
+import os
 import re
+import threading
+import time
+from contextlib import contextmanager
 from typing import Optional, Dict, Tuple, List
 from uuid import uuid4
 from datetime import datetime, timezone
 from collections import OrderedDict
-from langdetect import detect, LangDetectException
+import numpy as np
 
 from app.models import Conversation, Message
 from app.extensions import db
 from app.chains.prompt_template import get_prompt_template
-from app.services.embedding_loader import llm, vectorstore
+from app.services.embedding_loader import llm, vectorstore_holder
+from app.services.single_flight import SingleFlight
+from app.services.admission import AdmissionRejected, LLM_QUEUE_TIMEOUT, llm_admission
+from app.services.index_versions import VectorstoreHolder
+from app.services.retrieval import SCOPED_RETRIEVAL_K, scope_key, search_by_vectors
+from app.services.session_store import session_store, session_stats
 
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import (
@@ -19,32 +28,71 @@ from langchain.chains import (
 from langchain.prompts import PromptTemplate
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
 
-sessions: Dict[str, ConversationalRetrievalChain] = {}
+# Chains of recently used sessions in this worker (LRU). The chat history itself
+# lives in session_store, so evicted or unknown sessions are cheap to resume.
+sessions: "OrderedDict[str, ConversationalRetrievalChain]" = OrderedDict()
+sessions_lock = threading.Lock()
+LOCAL_SESSION_LIMIT = int(os.getenv("LOCAL_SESSION_LIMIT", "1000"))
+
+# One turn per session at a time: the cached chain holds the session's memory
+# and the scope of the current question. Entries exist only while in use.
+turn_locks: Dict[str, list] = {}
+turn_locks_lock = threading.Lock()
+
+# Number of chunks retrieved as context per question
+RETRIEVAL_K = 10
+
+# Coalesces identical first-turn questions that are answered at the same time
+question_flight = SingleFlight()
 
 class DefaultSourceRetriever(BaseRetriever):
-    """Retriever wrapper that adds default 'source' metadata if missing"""
-    retriever: BaseRetriever
+    """
+    Retriever that adds default 'source' metadata if missing.
+    The vectorstore is looked up per query, so cached chains use a newly
+    published index version without being rebuilt.
+    If a scope is set, only chunks of the scoped documents/categories are searched.
+    """
+    holder: VectorstoreHolder
+    k: int = RETRIEVAL_K
+    scope: Optional[Dict[str, List[str]]] = None
 
     class Config:
         arbitrary_types_allowed = True
 
-    def __init__(self, retriever: BaseRetriever, **kwargs):
-        super().__init__(retriever=retriever, **kwargs)
+    def __init__(self, holder: VectorstoreHolder, **kwargs):
+        super().__init__(holder=holder, **kwargs)
 
     def _get_relevant_documents(self, query: str, **kwargs) -> List[Document]:
-        docs = self.retriever.get_relevant_documents(query, **kwargs)
+        store = self.holder.get()
+        if self.scope:
+            docs = self._scoped_search(store, query)
+        else:
+            docs = store.similarity_search(query, k=self.k)
         return self._add_default_source(docs)
 
     async def _aget_relevant_documents(self, query: str, **kwargs) -> List[Document]:
-        docs = await self.retriever.aget_relevant_documents(query, **kwargs)
+        store = self.holder.get()
+        if self.scope:
+            docs = self._scoped_search(store, query)
+        else:
+            docs = await store.asimilarity_search(query, k=self.k)
         return self._add_default_source(docs)
 
+    def _scoped_search(self, store, query: str) -> List[Document]:
+        vector = np.asarray([store.embedding_function.embed_query(query)])
+        return search_by_vectors(store, vector, SCOPED_RETRIEVAL_K, self.scope)[0]
+
     def _add_default_source(self, docs: List[Document]) -> List[Document]:
-        for doc in docs:
-            if "source" not in doc.metadata:
-                doc.metadata["source"] = "Keine Quelle verfügbar"
-        return docs
+        return add_default_source(docs)
+
+
+def add_default_source(docs: List[Document]) -> List[Document]:
+    for doc in docs:
+        if "source" not in doc.metadata:
+            doc.metadata["source"] = "Keine Quelle verfügbar"
+    return docs
 
 
 def save_to_db(question: str, answer: str, session_id: str, sources: List[str]) -> Message:
@@ -71,38 +119,16 @@ def save_to_db(question: str, answer: str, session_id: str, sources: List[str])
     return message
 
 
-def get_or_create_chain(session_id: Optional[str]) -> Tuple[str, ConversationalRetrievalChain]:
-    new_session = False
-    if not session_id:
-        session_id = str(uuid4())
-        new_session = True
-
-    if session_id not in sessions:
-        memory = ConversationBufferMemory(
-            return_messages=True,
-            memory_key="chat_history",
-            input_key="question",
-            output_key="answer"
-        )
-
-        if not new_session:
-            conv_obj = Conversation.query.filter_by(session_id=session_id).first()
-            if conv_obj:
-                msgs = Message.query.filter_by(
-                    conversation_id=conv_obj.id
-                ).order_by(Message.timestamp.asc()).all()
-                for msg in msgs:
-                    memory.chat_memory.add_user_message(msg.question)
-                    memory.chat_memory.add_ai_message(msg.answer)
-
-        document_prompt = PromptTemplate(
-            input_variables=["page_content", "source"],
-            template="Vertragstext:\n{page_content}\n\nQuelle: {source}"
-        )
+def create_combine_docs_chain() -> StuffDocumentsChain:
+    """Builds the chain that answers a question from a list of retrieved documents."""
+    document_prompt = PromptTemplate(
+        input_variables=["page_content", "source"],
+        template="Vertragstext:\n{page_content}\n\nQuelle: {source}"
+    )
 
-        final_prompt = PromptTemplate(
-            input_variables=["language", "question", "context"],
-            template="""
+    final_prompt = PromptTemplate(
+        input_variables=["language", "question", "context"],
+        template="""
                 Beantworte die Frage so präzise wie möglich anhand des Kontextes.
                 Verwende pro Quelle einen Index und füge diese direkt nach der ersten Verwendung an in diesem Format: [1], [2], ... 
                 Antworte zwingend in der angegebenen Sprache: {language}.
@@ -115,23 +141,96 @@ def get_or_create_chain(session_id: Optional[str]) -> Tuple[str, ConversationalR
                 {context}
 
                 Antwort:
-            """.strip()
-        )
-        final_llm_chain = LLMChain(llm=llm, prompt=final_prompt)
+        """.strip()
+    )
+    final_llm_chain = LLMChain(llm=llm, prompt=final_prompt)
+
+    return StuffDocumentsChain(
+        llm_chain=final_llm_chain,
+        document_prompt=document_prompt,
+        document_variable_name="context",
+    )
+
+
+@contextmanager
+def session_turn(session_id: str):
+    """
+    Serializes turns of one session in this worker, so concurrent requests
+    neither overwrite each other's scope nor interleave their chat history.
+    Raises AdmissionRejected if the previous turn does not finish in time.
+    """
+    with turn_locks_lock:
+        entry = turn_locks.setdefault(session_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        if not entry[0].acquire(timeout=LLM_QUEUE_TIMEOUT):
+            raise AdmissionRejected("session_busy", 503, LLM_QUEUE_TIMEOUT)
+        try:
+            yield
+        finally:
+            entry[0].release()
+    finally:
+        with turn_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del turn_locks[session_id]
+
+
+def get_or_create_chain(
+    session_id: Optional[str],
+    scope: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[str, ConversationalRetrievalChain, Optional[str]]:
+    """
+    Returns (session_id, chain, language of the session's last answer).
+    The language is None for new sessions and sessions without a stored language.
+    For an existing session, call it and use the chain inside session_turn().
+    """
+    new_session = False
+    language = None
+    if not session_id:
+        session_id = str(uuid4())
+        new_session = True
+
+    with sessions_lock:
+        conv = sessions.get(session_id)
+        if conv is not None:
+            sessions.move_to_end(session_id)
+
+    if conv is not None:
+        # Another worker may have answered later turns of this session
+        session_stats.add("local_hits")
+        stored = load_stored_session(session_id)
+        if stored is not None:
+            history, language = stored
+            if len(history) > len(conv.memory.chat_memory.messages):
+                set_history(conv.memory, history)
 
-        combine_docs_chain = StuffDocumentsChain(
-            llm_chain=final_llm_chain,
-            document_prompt=document_prompt,
-            document_variable_name="context",
+    if conv is None:
+        memory = ConversationBufferMemory(
+            return_messages=True,
+            memory_key="chat_history",
+            input_key="question",
+            output_key="answer"
         )
 
+        if not new_session:
+            stored = load_stored_session(session_id)
+            if stored is not None:
+                history, language = stored
+            else:
+                history = rebuild_history(session_id)
+                if history:
+                    save_history(session_id, history)
+            set_history(memory, history)
+
+        combine_docs_chain = create_combine_docs_chain()
+
         question_generator = LLMChain(
             llm=llm,
             prompt=get_prompt_template()
         )
 
-        base_retriever = vectorstore.as_retriever(search_kwargs={"k": 10})
-        retriever = DefaultSourceRetriever(base_retriever)
+        retriever = DefaultSourceRetriever(vectorstore_holder)
 
         conv = ConversationalRetrievalChain(
             retriever=retriever,
@@ -140,8 +239,67 @@ def get_or_create_chain(session_id: Optional[str]) -> Tuple[str, ConversationalR
             question_generator=question_generator,
             return_source_documents=True,
         )
-        sessions[session_id] = conv
-    return session_id, sessions[session_id]
+        with sessions_lock:
+            sessions[session_id] = conv
+            while len(sessions) > LOCAL_SESSION_LIMIT:
+                sessions.popitem(last=False)
+
+    # The scope applies to the current question only; session_turn() keeps
+    # concurrent turns of the session from replacing it mid-question
+    conv.retriever.scope = scope
+    return session_id, conv, language
+
+
+def load_stored_session(session_id: str) -> Optional[Tuple[List[BaseMessage], Optional[str]]]:
+    """Loads (chat history, language) from the shared session store (None if unknown)."""
+    started = time.perf_counter()
+    try:
+        payload = session_store.get(session_id)
+    except Exception:
+        session_stats.add("store_errors")
+        return None
+    finally:
+        session_stats.add("lookup_ms_total", (time.perf_counter() - started) * 1000)
+
+    if payload is None:
+        session_stats.add("store_misses")
+        return None
+    session_stats.add("store_hits")
+    return messages_from_dict(payload["messages"]), payload.get("language")
+
+
+def rebuild_history(session_id: str) -> List[BaseMessage]:
+    """Rebuilds the chat history from the stored messages of the conversation."""
+    started = time.perf_counter()
+    memory = ConversationBufferMemory(return_messages=True)
+    conv_obj = Conversation.query.filter_by(session_id=session_id).first()
+    if conv_obj:
+        msgs = Message.query.filter_by(
+            conversation_id=conv_obj.id
+        ).order_by(Message.timestamp.asc()).all()
+        for msg in msgs:
+            memory.chat_memory.add_user_message(msg.question)
+            memory.chat_memory.add_ai_message(msg.answer)
+    session_stats.add("rebuilds")
+    session_stats.add("rebuild_ms_total", (time.perf_counter() - started) * 1000)
+    return memory.chat_memory.messages
+
+
+def set_history(memory: ConversationBufferMemory, history: List[BaseMessage]):
+    memory.chat_memory.clear()
+    memory.chat_memory.add_messages(history)
+
+
+def save_history(session_id: str, history: List[BaseMessage], language: Optional[str] = None):
+    try:
+        session_store.set(session_id, {"messages": messages_to_dict(history), "language": language})
+    except Exception:
+        session_stats.add("store_errors")
+
+
+def persist_history(session_id: str, conv: ConversationalRetrievalChain, language: Optional[str] = None):
+    """Writes the session's chat history and answer language to the shared store after a turn."""
+    save_history(session_id, conv.memory.chat_memory.messages, language)
 
 
 def format_with_footnotes(answer: str, source_docs: List[Document]) -> Tuple[str, List[dict]]:
@@ -154,7 +312,8 @@ def format_with_footnotes(answer: str, source_docs: List[Document]) -> Tuple[str
         source_docs (List[Document]): List of source documents retrieved for the answer.
     
     Returns:
-        Tuple[str, List[dict]]: The modified answer text with renumbered markers and a list of source dictionaries with continuous IDs and URLs.
+        Tuple[str, List[dict]]: The modified answer text with renumbered markers and a list of source dictionaries with continuous IDs and URLs
+        (plus "alternatives", the URLs of identical passages in other documents, where known).
     """
     # Find all markers in the order they appear in the text
     markers = re.findall(r'\[\d+\]', answer)
@@ -187,19 +346,62 @@ def format_with_footnotes(answer: str, source_docs: List[Document]) -> Tuple[str
     sources = []
     for new_id in range(1, len(unique_nums) + 1):
         original_num = unique_nums[new_id - 1]
+        source = {"id": new_id}
         if original_num <= len(source_docs):
-            url = source_docs[original_num - 1].metadata.get("source", "Keine Quelle verfügbar")
+            metadata = source_docs[original_num - 1].metadata
+            source["url"] = metadata.get("source", "Keine Quelle verfügbar")
+            # Same passage in other documents (merged near-duplicates)
+            if metadata.get("alternative_sources"):
+                source["alternatives"] = metadata["alternative_sources"]
         else:
-            url = "Quelle nicht gefunden"
-        sources.append({"id": new_id, "url": url})
+            source["url"] = "Quelle nicht gefunden"
+        sources.append(source)
     
     return answer, sources
-def detect_language(text: str) -> str:
-    """Erkennt die Sprache des Textes (de/fr/it/en)"""
-    try:
-        lang = detect(text)
-        if lang in ['de', 'fr', 'it', 'en']:
-            return lang
-    except LangDetectException:
-        pass
-    return 'de'  # Default
+
+
+def normalize_question(question: str) -> str:
+    """Normalizes a question for coalescing (case and whitespace insensitive)."""
+    return " ".join(question.casefold().split())
+
+
+def run_chain(conv: ConversationalRetrievalChain, question: str, language: str) -> Tuple[str, str, List[dict]]:
+    """
+    Runs the chain for one question. Returns (raw_answer, answer, sources).
+    Raises AdmissionRejected if no LLM slot becomes free in time.
+    """
+    with llm_admission.slot():
+        resp = conv({"question": question, "language": language})
+    raw_answer = resp.get("answer", "")
+
+    # Extract unique sources from documents
+    source_docs = resp.get("source_documents", [])
+    answer, sources = format_with_footnotes(raw_answer, source_docs)
+    return raw_answer, answer, sources
+
+
+def answer_first_turn(
+    question: str,
+    language: str,
+    scope: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[str, str, List[dict]]:
+    """
+    Answers a question without chat history in a new session.
+
+    Identical questions (same normalized text, language, scope and index version) that arrive while
+    one of them is being answered wait for that answer instead of running
+    their own retrieval and completion. Every caller still gets its own session,
+    whose memory is seeded with the shared answer.
+    """
+    session_id, conv, _ = get_or_create_chain(None, scope)
+    key = f"{vectorstore_holder.version}:{language}:{scope_key(scope)}:{normalize_question(question)}"
+    (raw_answer, answer, sources), shared = question_flight.do(
+        key, lambda: run_chain(conv, question, language)
+    )
+    if shared:
+        conv.memory.chat_memory.add_user_message(question)
+        conv.memory.chat_memory.add_ai_message(raw_answer)
+    persist_history(session_id, conv, language)
+    return session_id, answer, sources
+
+
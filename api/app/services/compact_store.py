@@ -0,0 +1,389 @@
+"""
+Compact on-disk docstore for the FAISS vectorstore.
+
+Instead of pickling one Document per chunk (index.pkl), the chunks are stored
+column-wise next to index.faiss:
+
+    texts.bin / text_offsets.npy       packed UTF-8 chunk texts + byte offsets
+    anchors.bin / anchor_offsets.npy   packed source anchors ("p123") + offsets
+    doc_ids.npy                        per chunk: index into meta.json "documents"
+    meta.json                          format version, count, interned document paths
+                                       and the category of each document
+
+Optional, for near-duplicate chunks merged at build time (one row per merged copy):
+
+    alt_chunk_ids.npy                  chunk that the copy was merged into
+    alt_doc_ids.npy                    document of the copy
+    alt_anchors.bin / alt_anchor_offsets.npy   source anchor of the copy
+
+At load time everything is memory-mapped; Document objects are only created for
+the hits a search actually returns.
+
+The writer only appends to files (offsets and doc ids go to raw *.part files
+that become the .npy files on close), so its memory use does not grow with the
+corpus and an interrupted build can continue from CompactStoreWriter.state().
+"""
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+INDEX_FILE = "index.faiss"
+
+
+def is_compact_store(path: str) -> bool:
+    return os.path.exists(os.path.join(path, META_FILE))
+
+
+def split_source(source: str):
+    """'/contracts/x.html#p12' -> ('/contracts/x.html', 'p12')"""
+    document, _, anchor = source.partition("#")
+    return document, anchor
+
+
+def document_name(path: str) -> str:
+    """'/contracts/15_Stromabkommen_(DE).html' -> '15_Stromabkommen_(DE)'"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+class _StringColumn:
+    """Read-only view on a packed UTF-8 blob with an offset array."""
+
+    def __init__(self, blob_path: str, offsets_path: str):
+        self._offsets = np.load(offsets_path, mmap_mode="r")
+        self._file = open(blob_path, "rb")
+        if os.path.getsize(blob_path) > 0:
+            self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._blob = b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._blob[start:end].decode("utf-8")
+
+
+def _open_for_append(path: str, size: int):
+    """Opens a file for appending after cutting it to size (0 = start empty)."""
+    # truncate() would pad a missing or shorter file with zeros
+    if size and (not os.path.exists(path) or os.path.getsize(path) < size):
+        raise ValueError(f"Cannot resume: {path} is missing or shorter than recorded")
+    f = open(path, "ab")
+    f.truncate(size)
+    return f
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _raw_to_npy(raw_path: str, npy_path: str, dtype: np.dtype, prefix: bytes = b""):
+    """Writes prefix + the raw values of raw_path as a 1-d .npy file without loading them."""
+    count = (len(prefix) + os.path.getsize(raw_path)) // dtype.itemsize
+    with open(npy_path, "wb") as out, open(raw_path, "rb") as raw:
+        np.lib.format.write_array_header_1_0(out, {"descr": dtype.str, "fortran_order": False, "shape": (count,)})
+        out.write(prefix)
+        shutil.copyfileobj(raw, out)
+    os.remove(raw_path)
+
+
+class _StringColumnWriter:
+    """Appends strings to a packed UTF-8 blob and their end offsets to a raw int64 file."""
+
+    OFFSET = np.dtype("<i8")
+
+    def __init__(self, blob_path: str, offsets_path: str, blob_size: int = 0, count: int = 0):
+        self._offsets_path = offsets_path
+        self._ends_path = offsets_path + ".part"
+        self._file = _open_for_append(blob_path, blob_size)
+        self._ends = _open_for_append(self._ends_path, count * self.OFFSET.itemsize)
+        self.size = blob_size
+
+    def append(self, value: str):
+        data = value.encode("utf-8")
+        self._file.write(data)
+        self.size += len(data)
+        self._ends.write(struct.pack("<q", self.size))
+
+    def flush(self):
+        _sync(self._file)
+        _sync(self._ends)
+
+    def close(self):
+        self._file.close()
+        self._ends.close()
+        _raw_to_npy(self._ends_path, self._offsets_path, self.OFFSET, prefix=struct.pack("<q", 0))
+
+
+class _RangeIds(Mapping):
+    """index_to_docstore_id for a store whose docstore ids are the FAISS ids."""
+
+    def __init__(self, n: int):
+        self._n = n
+
+    def __getitem__(self, i: int) -> int:
+        if not 0 <= i < self._n:
+            raise KeyError(i)
+        return i
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._n))
+
+
+class CompactDocstore(Docstore):
+    """Memory-mapped docstore; ids are the row numbers in the FAISS index."""
+
+    SCOPE_CACHE_SIZE = 256  # id arrays of the most recently used scopes
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compact store format: {self.meta.get('format')}")
+
+        self.documents: List[str] = self.meta["documents"]
+        self.document_names = [document_name(d) for d in self.documents]
+        self.categories: List[Optional[str]] = self.meta.get("categories") or [None] * len(self.documents)
+        # Valid values per scope key, for validating client-supplied scopes
+        self.scope_values: Dict[str, set] = {
+            "document": set(self.document_names),
+            "category": {c for c in self.categories if c},
+        }
+        self._scope_ids: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._scope_lock = threading.Lock()
+        self.texts = _StringColumn(os.path.join(path, "texts.bin"), os.path.join(path, "text_offsets.npy"))
+        self.anchors = _StringColumn(os.path.join(path, "anchors.bin"), os.path.join(path, "anchor_offsets.npy"))
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+
+        if os.path.exists(os.path.join(path, "alt_chunk_ids.npy")):
+            self.alt_chunk_ids = np.load(os.path.join(path, "alt_chunk_ids.npy"))
+            self.alt_doc_ids = np.load(os.path.join(path, "alt_doc_ids.npy"), mmap_mode="r")
+            self.alt_anchors = _StringColumn(
+                os.path.join(path, "alt_anchors.bin"), os.path.join(path, "alt_anchor_offsets.npy")
+            )
+        else:
+            self.alt_chunk_ids = np.empty(0, dtype=np.int32)
+            self.alt_doc_ids = np.empty(0, dtype=np.int32)
+            self.alt_anchors = None
+        # Rows of the merged copies grouped by chunk, for the lookup in alternative_sources()
+        self._alt_order = np.argsort(self.alt_chunk_ids, kind="stable")
+        self._alt_sorted_ids = self.alt_chunk_ids[self._alt_order]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def _source(self, doc_id: int, anchor: str) -> str:
+        document = self.documents[doc_id]
+        return f"{document}#{anchor}" if anchor else document
+
+    def source(self, i: int) -> str:
+        return self._source(int(self.doc_ids[i]), self.anchors[i])
+
+    def alternative_sources(self, i: int) -> List[str]:
+        """Sources of the near-duplicate copies that were merged into chunk i."""
+        start, end = np.searchsorted(self._alt_sorted_ids, [i, i + 1])
+        return [
+            self._source(int(self.alt_doc_ids[j]), self.alt_anchors[j])
+            for j in self._alt_order[start:end]
+        ]
+
+    def search(self, search) -> Document:
+        i = int(search)
+        if not 0 <= i < len(self):
+            return f"ID {search} not found."
+        doc_id = int(self.doc_ids[i])
+        metadata = {"source": self.source(i), "document": self.document_names[doc_id]}
+        if self.categories[doc_id]:
+            metadata["category"] = self.categories[doc_id]
+        alternatives = self.alternative_sources(i)
+        if alternatives:
+            metadata["alternative_sources"] = alternatives
+        return Document(page_content=self.texts[i], metadata=metadata)
+
+    def ids_for_scope(self, scope: Dict[str, List[str]]) -> np.ndarray:
+        """
+        Returns the (sorted) FAISS ids of all chunks within the given scope,
+        including chunks with a merged copy from a scoped document.
+        """
+        key = tuple(sorted((k, tuple(sorted(v))) for k, v in scope.items()))
+        with self._scope_lock:
+            ids = self._scope_ids.get(key)
+            if ids is not None:
+                self._scope_ids.move_to_end(key)
+                return ids
+
+        documents = set(scope.get("document", []))
+        categories = set(scope.get("category", []))
+        matching = [
+            doc_id for doc_id in range(len(self.documents))
+            if (not documents or self.document_names[doc_id] in documents)
+            and (not categories or self.categories[doc_id] in categories)
+        ]
+        ids = np.flatnonzero(np.isin(self.doc_ids, matching)).astype(np.int64)
+        if len(self.alt_chunk_ids):
+            ids = np.union1d(ids, self.alt_chunk_ids[np.isin(self.alt_doc_ids, matching)]).astype(np.int64)
+        with self._scope_lock:
+            self._scope_ids[key] = ids
+            while len(self._scope_ids) > self.SCOPE_CACHE_SIZE:
+                self._scope_ids.popitem(last=False)
+        return ids
+
+
+class CompactStoreWriter:
+    """
+    Writes chunks in the compact format; the FAISS index is passed to close().
+    add_alternative() records a near-duplicate copy that gets no vector of its own.
+    Pass the dict returned by state() to continue an interrupted write.
+    """
+
+    DOC_ID = np.dtype("<i4")
+
+    def __init__(self, path: str, state: Optional[dict] = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        if state and is_compact_store(path):
+            raise ValueError(f"Cannot resume: the store in {path} is already closed")
+        # An existing store in this directory is invalid from now on
+        if is_compact_store(path):
+            os.remove(os.path.join(path, META_FILE))
+        state = state or {}
+        self.count = state.get("count", 0)
+        self._texts = _StringColumnWriter(
+            os.path.join(path, "texts.bin"), os.path.join(path, "text_offsets.npy"),
+            state.get("texts_bytes", 0), self.count,
+        )
+        self._anchors = _StringColumnWriter(
+            os.path.join(path, "anchors.bin"), os.path.join(path, "anchor_offsets.npy"),
+            state.get("anchors_bytes", 0), self.count,
+        )
+        self._doc_ids_path = os.path.join(path, "doc_ids.npy.part")
+        self._doc_ids = _open_for_append(self._doc_ids_path, self.count * self.DOC_ID.itemsize)
+        self.alternatives = state.get("alternatives", 0)
+        self._alt_chunk_ids_path = os.path.join(path, "alt_chunk_ids.npy.part")
+        self._alt_chunk_ids = _open_for_append(self._alt_chunk_ids_path, self.alternatives * self.DOC_ID.itemsize)
+        self._alt_doc_ids_path = os.path.join(path, "alt_doc_ids.npy.part")
+        self._alt_doc_ids = _open_for_append(self._alt_doc_ids_path, self.alternatives * self.DOC_ID.itemsize)
+        self._alt_anchors = _StringColumnWriter(
+            os.path.join(path, "alt_anchors.bin"), os.path.join(path, "alt_anchor_offsets.npy"),
+            state.get("alt_anchors_bytes", 0), self.alternatives,
+        )
+        self._documents: Dict[str, int] = {d: i for i, d in enumerate(state.get("documents", []))}
+        self._categories: List[Optional[str]] = list(state.get("categories", []))
+
+    def _document_id(self, document: str, metadata: dict) -> int:
+        doc_id = self._documents.get(document)
+        if doc_id is None:
+            doc_id = self._documents[document] = len(self._documents)
+            self._categories.append(metadata.get("category"))
+        return doc_id
+
+    def add(self, text: str, metadata: dict):
+        document, anchor = split_source(metadata.get("source", ""))
+        doc_id = self._document_id(document, metadata)
+        self._texts.append(text)
+        self._anchors.append(anchor)
+        self._doc_ids.write(struct.pack("<i", doc_id))
+        self.count += 1
+
+    def add_alternative(self, chunk_id: int, metadata: dict):
+        """Records the source of a copy of chunk chunk_id (which may still be added later)."""
+        document, anchor = split_source(metadata.get("source", ""))
+        doc_id = self._document_id(document, metadata)
+        self._alt_chunk_ids.write(struct.pack("<i", chunk_id))
+        self._alt_doc_ids.write(struct.pack("<i", doc_id))
+        self._alt_anchors.append(anchor)
+        self.alternatives += 1
+
+    def state(self) -> dict:
+        """Flushes all chunks to disk and returns what is needed to resume after them."""
+        self._texts.flush()
+        self._anchors.flush()
+        _sync(self._doc_ids)
+        _sync(self._alt_chunk_ids)
+        _sync(self._alt_doc_ids)
+        self._alt_anchors.flush()
+        return {
+            "count": self.count,
+            "texts_bytes": self._texts.size,
+            "anchors_bytes": self._anchors.size,
+            "alternatives": self.alternatives,
+            "alt_anchors_bytes": self._alt_anchors.size,
+            "documents": list(self._documents),
+            "categories": list(self._categories),
+        }
+
+    def close(self, index):
+        if index.ntotal != self.count:
+            raise ValueError(f"Index has {index.ntotal} vectors but {self.count} chunks were written")
+        self._texts.close()
+        self._anchors.close()
+        self._doc_ids.close()
+        _raw_to_npy(self._doc_ids_path, os.path.join(self.path, "doc_ids.npy"), self.DOC_ID)
+        self._alt_chunk_ids.close()
+        self._alt_doc_ids.close()
+        self._alt_anchors.close()
+        _raw_to_npy(self._alt_chunk_ids_path, os.path.join(self.path, "alt_chunk_ids.npy"), self.DOC_ID)
+        _raw_to_npy(self._alt_doc_ids_path, os.path.join(self.path, "alt_doc_ids.npy"), self.DOC_ID)
+        if self.alternatives and int(np.load(os.path.join(self.path, "alt_chunk_ids.npy")).max()) >= self.count:
+            raise ValueError("An alternative source refers to a chunk that was never written")
+        faiss.write_index(index, os.path.join(self.path, INDEX_FILE))
+
+        # meta.json is written last: only then the store counts as complete
+        meta = {
+            "format": FORMAT_VERSION,
+            "count": self.count,
+            "dim": index.d,
+            "documents": list(self._documents),
+            "categories": self._categories,
+        }
+        tmp_path = os.path.join(self.path, META_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.path, META_FILE))
+
+
+def load_compact_vectorstore(path: str, embeddings: Embeddings) -> FAISS:
+    docstore = CompactDocstore(path)
+    index = faiss.read_index(os.path.join(path, INDEX_FILE))
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=_RangeIds(len(docstore)),
+    )
+
+
+def convert_pickle_store(path: str, out_path: Optional[str] = None):
+    """Converts a FAISS.save_local() directory (index.faiss + index.pkl) to the compact format."""
+    import pickle
+
+    out_path = out_path or path
+    index = faiss.read_index(os.path.join(path, INDEX_FILE))
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    writer = CompactStoreWriter(out_path)
+    for i in range(index.ntotal):
+        doc = docstore.search(index_to_docstore_id[i])
+        writer.add(doc.page_content, doc.metadata)
+    writer.close(index)
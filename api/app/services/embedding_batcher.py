@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import Counter, deque
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class _Query:
+    def __init__(self, text: str):
+        self.text = text
+        self.enqueued_at = time.perf_counter()
+        self.picked = threading.Event()
+        self.done = threading.Event()
+        self.vector: Optional[List[float]] = None
+        self.error: Optional[BaseException] = None
+
+
+class EmbeddingBatcher(Embeddings):
+    """
+    Micro-batches query embeddings of concurrent requests.
+
+    embed_query() puts the text into a queue and waits. A dispatcher thread
+    takes the first waiting query, collects everything else that arrives within
+    window_ms (up to max_batch_size queries) and encodes the batch with one
+    embed_documents() call, which is far cheaper per query than batch size 1.
+    embed_documents() is already batched and goes straight to the model.
+    With window_ms <= 0 the batcher is a plain pass-through.
+
+    A query that is not answered within timeout seconds (e.g. the dispatcher
+    thread died) is encoded directly by the caller; a dead dispatcher is
+    restarted on the next query. The caller waits in _wait_queued and then in
+    _wait_encoded, so request profiles show queueing and batch encoding as
+    separate frames instead of one threading:wait.
+    """
+
+    RECENT_DELAYS = 1000  # queue delays kept for the percentiles
+
+    def __init__(self, embeddings: Embeddings, window_ms: float, max_batch_size: int, timeout: float = 5.0):
+        self.embeddings = embeddings
+        self.window = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._batch_sizes: Counter = Counter()
+        self._delays_ms: deque = deque(maxlen=self.RECENT_DELAYS)
+        self._stats = {
+            "queries": 0, "batches": 0, "errors": 0, "fallbacks": 0, "restarts": 0,
+            "queue_ms_total": 0.0, "encode_ms_total": 0.0,
+        }
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.window <= 0:
+            return self.embeddings.embed_query(text)
+
+        query = _Query(text)
+        with self._cond:
+            # Started on first use, so no thread exists before gunicorn forks
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is not None:
+                    self._stats["restarts"] += 1
+                self._thread = threading.Thread(target=self._dispatch, name="embedding-batcher", daemon=True)
+                self._thread.start()
+            self._queue.append(query)
+            self._cond.notify()
+
+        deadline = time.monotonic() + self.timeout
+        if not (self._wait_queued(query, deadline) and self._wait_encoded(query, deadline)):
+            with self._cond:
+                if query in self._queue:
+                    self._queue.remove(query)
+                self._stats["fallbacks"] += 1
+            return self.embeddings.embed_query(text)
+        if query.error is not None:
+            raise query.error
+        return query.vector
+
+    @staticmethod
+    def _wait_queued(query: _Query, deadline: float) -> bool:
+        return query.picked.wait(max(0.0, deadline - time.monotonic()))
+
+    @staticmethod
+    def _wait_encoded(query: _Query, deadline: float) -> bool:
+        return query.done.wait(max(0.0, deadline - time.monotonic()))
+
+    def _next_batch(self) -> List[_Query]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].enqueued_at + self.window
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch_size))]
+        for q in batch:
+            q.picked.set()
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            try:
+                vectors = self.embeddings.embed_documents([q.text for q in batch])
+                if len(vectors) != len(batch):
+                    raise ValueError(f"expected {len(batch)} embeddings, got {len(vectors)}")
+                error = None
+            except Exception as e:
+                vectors = [None] * len(batch)
+                error = e
+            finished = time.perf_counter()
+
+            with self._cond:
+                self._stats["queries"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["errors"] += int(error is not None)
+                self._stats["encode_ms_total"] += (finished - started) * 1000
+                self._batch_sizes[len(batch)] += 1
+                for q in batch:
+                    delay_ms = (started - q.enqueued_at) * 1000
+                    self._stats["queue_ms_total"] += delay_ms
+                    self._delays_ms.append(delay_ms)
+
+            for q, vector in zip(batch, vectors):
+                q.vector = vector
+                q.error = error
+                q.done.set()
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            sizes = dict(sorted(self._batch_sizes.items()))
+            delays = sorted(self._delays_ms)
+        queries, batches = stats["queries"], stats["batches"]
+        stats.update({
+            "enabled": self.window > 0,
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batch_sizes": {str(size): count for size, count in sizes.items()},
+            "batch_size_avg": queries / batches if batches else None,
+            "queue_ms_avg": stats["queue_ms_total"] / queries if queries else None,
+            "queue_ms_p50": delays[len(delays) // 2] if delays else None,
+            "queue_ms_p95": delays[int(len(delays) * 0.95)] if delays else None,
+            "encode_ms_avg": stats["encode_ms_total"] / batches if batches else None,
+        })
+        return stats
@@ -1,14 +1,70 @@
+import os
 from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.chat_models import ChatOpenAI
+from app.services.compact_store import is_compact_store, load_compact_vectorstore
+from app.services.index_versions import VectorstoreHolder
+from app.services.embedding_batcher import EmbeddingBatcher
 
-embedding_model = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+VECTORSTORE_PATH = os.getenv("VECTORSTORE_PATH", "./app/data/vectorstore_index")
+# Seconds between checks for a new index version (0 disables hot swapping)
+INDEX_POLL_INTERVAL = float(os.getenv("INDEX_POLL_INTERVAL", "30"))
 
-vectorstore = FAISS.load_local(
-    "./app/data/vectorstore_index",
-    embedding_model,
-    allow_dangerous_deserialization=True
+# "openai" (default) or "stub" for the offline StubChatModel
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+# "sentence-transformers" (default) or "stub" for deterministic fake embeddings
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+# Query embeddings of concurrent requests arriving within this window are
+# encoded together (0 disables micro-batching)
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "2"))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+# Max. seconds a query waits for its batch before it is encoded directly
+EMBEDDING_BATCH_TIMEOUT = float(os.getenv("EMBEDDING_BATCH_TIMEOUT", "5"))
+
+
+def create_embedding_model():
+    if EMBEDDING_BACKEND == "stub":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        # Same dimension as all-MiniLM-L6-v2, so the existing index can be searched
+        return DeterministicFakeEmbedding(size=384)
+    return SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+
+
+def create_llm():
+    if LLM_BACKEND == "stub":
+        from app.services.stub_llm import StubChatModel
+        return StubChatModel(
+            latency=float(os.getenv("STUB_LLM_LATENCY", "0.2")),
+            tokens_per_second=float(os.getenv("STUB_LLM_TOKENS_PER_SECOND", "50")),
+            answer_tokens=int(os.getenv("STUB_LLM_ANSWER_TOKENS", "60")),
+        )
+    return ChatOpenAI(
+        model="gpt-4.1-mini",
+        temperature=1,
+        # Fail fast instead of blocking a worker thread on a slow upstream
+        request_timeout=float(os.getenv("LLM_TIMEOUT", "30")),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", "1")),
+    )
+
+
+def load_vectorstore(path, embeddings):
+    if is_compact_store(path):
+        return load_compact_vectorstore(path, embeddings)
+    # Older indexes built before the compact format
+    return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+
+embedding_model = EmbeddingBatcher(
+    create_embedding_model(), EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_TIMEOUT
 )
 
-llm = ChatOpenAI(model="gpt-4.1-mini", temperature=1)
+# Always use vectorstore_holder.get(): the vectorstore is replaced when a new
+# index version is published by preprocessing
+vectorstore_holder = VectorstoreHolder(
+    VECTORSTORE_PATH,
+    lambda path: load_vectorstore(path, embedding_model),
+    INDEX_POLL_INTERVAL,
+)
+vectorstore_holder.start_watcher()
 
+llm = create_llm()
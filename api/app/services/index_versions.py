@@ -0,0 +1,113 @@
+"""
+Versioned vectorstore directories with an atomic "current" pointer.
+
+    vectorstore_index/
+        CURRENT                 name of the active version (replaced atomically)
+        versions/20261018T120000/
+        versions/20261019T080000/
+
+Preprocessing writes a new version and then flips CURRENT. Each worker polls
+CURRENT, loads a new version in the background and swaps it in; requests that
+already hold the old vectorstore finish on it. A directory without CURRENT is
+treated as a single unversioned index (layout before versioning).
+"""
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple
+
+POINTER_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+UNVERSIONED = "unversioned"
+
+
+def new_version_path(root: str) -> Tuple[str, str]:
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return version, os.path.join(root, VERSIONS_DIR, version)
+
+
+def read_current_version(root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(root, POINTER_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_version(root: str) -> Tuple[str, str]:
+    """Returns (version, path) of the active index."""
+    version = read_current_version(root)
+    if version is None:
+        return UNVERSIONED, root
+    return version, os.path.join(root, VERSIONS_DIR, version)
+
+
+def publish_version(root: str, version: str, keep: int = 3):
+    """Makes a fully written version the current one and removes old versions."""
+    tmp_path = os.path.join(root, POINTER_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(root, POINTER_FILE))
+
+    # Older versions stay for a while so workers can still finish loading them
+    versions = sorted(os.listdir(os.path.join(root, VERSIONS_DIR)))
+    for old in versions[:-keep]:
+        if old != version:
+            shutil.rmtree(os.path.join(root, VERSIONS_DIR, old), ignore_errors=True)
+
+
+class VectorstoreHolder:
+    """
+    Holds the vectorstore of the current index version and swaps it when
+    CURRENT changes. get() returns a consistent vectorstore for one request.
+    """
+
+    def __init__(self, root: str, loader: Callable[[str], object], poll_interval: float = 30.0):
+        self.root = root
+        self.loader = loader
+        self.poll_interval = poll_interval
+        self._reload_lock = threading.Lock()
+        self._failed_version: Optional[str] = None
+        version, path = resolve_version(root)
+        self._current = (version, loader(path))
+
+    @property
+    def version(self) -> str:
+        return self._current[0]
+
+    def get(self):
+        return self._current[1]
+
+    def check_for_update(self) -> bool:
+        with self._reload_lock:
+            version, path = resolve_version(self.root)
+            if version in (self.version, self._failed_version):
+                return False
+            print(f"Lade Vectorstore-Version {version} ...")
+            try:
+                vectorstore = self.loader(path)
+            except Exception:
+                self._failed_version = version
+                raise
+            # A single reference assignment: readers see either the old or the new store
+            self._current = (version, vectorstore)
+            print(f"Vectorstore-Version {version} aktiv")
+        return True
+
+    def start_watcher(self):
+        if self.poll_interval <= 0:
+            return
+        threading.Thread(target=self._watch, name="vectorstore-watcher", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.check_for_update()
+            except Exception as e:
+                # Keep serving the current version; retry on the next poll
+                print(f"Neue Vectorstore-Version konnte nicht geladen werden: {e}")
@@ -0,0 +1,142 @@
+"""
+Opt-in sampling profiler for single production requests.
+
+A request is profiled if it sends `X-Profile: <PROFILE_TOKEN>` (only when a
+token is configured) or, for the paths in PROFILE_PATHS, by chance with
+PROFILE_SAMPLE_RATE. A background thread samples the request thread's stack
+every PROFILE_INTERVAL_MS and writes the result in the collapsed ("folded")
+format understood by flamegraph.pl, speedscope and inferno:
+
+    app.routes.ask:ask;...;chat_service:get_or_create_chain 42
+
+Files go to PROFILE_DIR, which is kept at PROFILE_MAX_FILES files (oldest are
+deleted first). The file name is returned in the X-Profile-Id response header.
+"""
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from flask import g, request
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_PATHS = tuple(p for p in os.getenv("PROFILE_PATHS", "/ask").split(",") if p)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./instance/profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    # ";" separates frames in the folded format
+    return f"{module}:{code.co_name}".replace(";", ",")
+
+
+class StackSampler:
+    """Samples the stack of one thread at a fixed interval."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self.counts
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class RequestProfiler:
+    def init_app(self, app):
+        if not PROFILE_TOKEN and PROFILE_SAMPLE_RATE <= 0:
+            return  # disabled: no per-request overhead at all
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _should_profile(self) -> bool:
+        header = request.headers.get("X-Profile")
+        # Compared as bytes: compare_digest raises on non-ASCII str (headers are latin-1)
+        if header and PROFILE_TOKEN and hmac.compare_digest(
+            header.encode("latin-1", "replace"), PROFILE_TOKEN.encode("utf-8")
+        ):
+            return True
+        return request.path in PROFILE_PATHS and random.random() < PROFILE_SAMPLE_RATE
+
+    def _before_request(self):
+        if self._should_profile():
+            g.profiler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000).start()
+
+    def _after_request(self, response):
+        profile_id = self._finish()
+        if profile_id:
+            response.headers["X-Profile-Id"] = profile_id
+        return response
+
+    def _teardown_request(self, exc):
+        # Requests that raised never reach after_request
+        self._finish()
+
+    def _finish(self):
+        sampler = g.pop("profiler", None)
+        if sampler is None:
+            return None
+        counts = sampler.stop()
+        if not counts:
+            # Faster than one interval: an empty file would only take a ring buffer slot
+            return None
+        try:
+            return self._write(counts, sampler.elapsed)
+        except OSError as e:
+            print(f"Profil konnte nicht geschrieben werden: {e}")
+            return None
+
+    def _write(self, counts: Counter, elapsed: float) -> str:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        path_part = request.path.strip("/").replace("/", "-") or "root"
+        profile_id = f"{timestamp}-{path_part}-{int(elapsed * 1000)}ms-{uuid4().hex[:8]}.folded"
+
+        with open(os.path.join(PROFILE_DIR, profile_id), "w", encoding="utf-8") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+        # Ring buffer: names start with the timestamp, so sorting gives the age
+        files = sorted(f for f in os.listdir(PROFILE_DIR) if f.endswith(".folded"))
+        for old in files[:-PROFILE_MAX_FILES]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, old))
+            except OSError:
+                pass
+        return profile_id
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,116 @@
+import os
+from typing import Dict, List, Optional, Set
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app.services.compact_store import CompactDocstore, document_name, split_source
+
+# Fields a search can be restricted to
+SCOPE_KEYS = ("document", "category")
+# Scoped searches only look at the relevant documents, so fewer chunks suffice
+SCOPED_RETRIEVAL_K = int(os.getenv("SCOPED_RETRIEVAL_K", "6"))
+# Over-fetch factor for indexes without a compact docstore (post-filtering)
+POST_FILTER_FETCH_FACTOR = 10
+
+
+def known_scope_values(vectorstore: FAISS) -> Optional[Dict[str, Set[str]]]:
+    """Documents and categories of an index, or None if the index does not list them."""
+    docstore = vectorstore.docstore
+    if isinstance(docstore, CompactDocstore):
+        return docstore.scope_values
+    return None
+
+
+def parse_scope(value, known: Optional[Dict[str, Set[str]]] = None) -> Optional[Dict[str, List[str]]]:
+    """
+    Validates a scope from a request, e.g. {"category": "abkommen"} or
+    {"document": ["15_Stromabkommen_(DE)"]}. Returns None for no scope.
+    With known (see known_scope_values), unknown documents and categories are
+    rejected instead of silently matching nothing.
+    Raises ValueError for invalid input.
+    """
+    if value is None:
+        return None
+    if not isinstance(value, dict) or set(value) - set(SCOPE_KEYS):
+        raise ValueError(f"scope must be an object with the keys {', '.join(SCOPE_KEYS)}")
+
+    scope = {}
+    for key, values in value.items():
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list) or not all(isinstance(v, str) and v for v in values):
+            raise ValueError(f"scope.{key} must be a string or a list of strings")
+        unknown = [v for v in values if known is not None and v not in known[key]]
+        if unknown:
+            raise ValueError(f"Unknown scope.{key}: {', '.join(unknown)}")
+        if values:
+            scope[key] = values
+    return scope or None
+
+
+def scope_key(scope: Optional[Dict[str, List[str]]]) -> str:
+    if not scope:
+        return ""
+    return ";".join(f"{k}={','.join(sorted(v))}" for k, v in sorted(scope.items()))
+
+
+def _matches_scope(metadata: dict, scope: Dict[str, List[str]]) -> bool:
+    document = metadata.get("document") or document_name(split_source(metadata.get("source", ""))[0])
+    if "document" in scope and document not in scope["document"]:
+        return False
+    if "category" in scope and metadata.get("category") not in scope["category"]:
+        return False
+    return True
+
+
+def search_by_vectors(
+    vectorstore: FAISS,
+    vectors: np.ndarray,
+    k: int,
+    scope: Optional[Dict[str, List[str]]] = None,
+) -> List[List[Document]]:
+    """
+    Searches the index for a matrix of query vectors (one row per query).
+
+    With a compact docstore, scoped searches are pre-filtered with a FAISS ID
+    selector so only the vectors of the scoped documents are compared. Older
+    pickle indexes fall back to over-fetching and filtering the hits.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        faiss.normalize_L2(vectors)
+
+    docstore = vectorstore.docstore
+    post_filter = False
+    fetch_k = k
+    if scope and isinstance(docstore, CompactDocstore):
+        ids = docstore.ids_for_scope(scope)
+        if len(ids) == 0:
+            return [[] for _ in range(len(vectors))]
+        selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+        _, indices = vectorstore.index.search(vectors, min(k, len(ids)), params=faiss.SearchParameters(sel=selector))
+    else:
+        if scope:
+            post_filter = True
+            fetch_k = k * POST_FILTER_FETCH_FACTOR
+        _, indices = vectorstore.index.search(vectors, fetch_k)
+
+    results = []
+    for row in indices:
+        docs = []
+        for i in row:
+            if i == -1:
+                continue
+            doc = docstore.search(vectorstore.index_to_docstore_id[int(i)])
+            if not isinstance(doc, Document):
+                continue
+            if post_filter and not _matches_scope(doc.metadata, scope):
+                continue
+            docs.append(doc)
+            if len(docs) == k:
+                break
+        results.append(docs)
+    return results
@@ -0,0 +1,145 @@
+"""
+Shared chat history per session, so that any gunicorn worker can resume a
+conversation with one key lookup instead of rebuilding it from the Message table.
+
+Backends (SESSION_STORE):
+    sqlite  (default) SQLite file shared by all workers on the host (SESSION_STORE_URL = path)
+    redis   Redis or a compatible server (SESSION_STORE_URL = redis://...), needs the redis package
+    memory  per process only, e.g. for the development server
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+# "sqlite" (default), "redis" or "memory"
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite")
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "./instance/session_store.db")
+# Seconds a conversation stays resumable without a new message
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(24 * 3600)))
+
+
+class MemorySessionStore:
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: Dict[str, tuple] = {}
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            item = self._data.get(session_id)
+            if item is None:
+                return None
+            payload, expires_at = item
+            if expires_at < time.time():
+                del self._data[session_id]
+                return None
+            return json.loads(payload)
+
+    def set(self, session_id: str, value: dict):
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._data[session_id] = (payload, time.time() + self.ttl)
+
+
+class SQLiteSessionStore:
+    """One row per session in a WAL-mode SQLite file; one connection per thread."""
+
+    CLEANUP_EVERY = 500  # writes between deleting expired rows
+
+    def __init__(self, path: str, ttl: int):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_history ("
+            "session_id TEXT PRIMARY KEY, payload TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT payload FROM session_history WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, session_id: str, value: dict):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO session_history (session_id, payload, expires_at) VALUES (?, ?, ?)",
+            (session_id, json.dumps(value, ensure_ascii=False), now + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % self.CLEANUP_EVERY == 0:
+            conn.execute("DELETE FROM session_history WHERE expires_at <= ?", (now,))
+        conn.commit()
+
+
+class RedisSessionStore:
+    def __init__(self, url: str, ttl: int):
+        import redis
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, session_id: str) -> Optional[dict]:
+        payload = self._client.get(f"session:{session_id}")
+        return json.loads(payload) if payload else None
+
+    def set(self, session_id: str, value: dict):
+        self._client.setex(f"session:{session_id}", self.ttl, json.dumps(value, ensure_ascii=False))
+
+
+def create_session_store():
+    if SESSION_STORE == "redis":
+        return RedisSessionStore(SESSION_STORE_URL, SESSION_TTL)
+    if SESSION_STORE == "memory":
+        return MemorySessionStore(SESSION_TTL)
+    return SQLiteSessionStore(SESSION_STORE_URL, SESSION_TTL)
+
+
+session_store = create_session_store()
+
+
+class SessionStats:
+    """Hit rate of the shared store and cost of the DB rebuilds it avoids."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "local_hits": 0, "store_hits": 0, "store_misses": 0, "store_errors": 0,
+            "rebuilds": 0, "rebuild_ms_total": 0.0, "lookup_ms_total": 0.0,
+        }
+
+    def add(self, key: str, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["store_hits"] + stats["store_misses"]
+        stats["store_hit_rate"] = stats["store_hits"] / lookups if lookups else None
+        stats["rebuild_ms_avg"] = stats["rebuild_ms_total"] / stats["rebuilds"] if stats["rebuilds"] else None
+        stats["lookup_ms_avg"] = stats["lookup_ms_total"] / lookups if lookups else None
+        return stats
+
+
+session_stats = SessionStats()
@@ -0,0 +1,75 @@
+import hashlib
+import random
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+_WORDS = (
+    "Schweiz EU Abkommen Vertrag Regelung Bereich Zusammenarbeit Binnenmarkt "
+    "Streitbeilegung Schiedsgericht Übernahme Recht Personenfreizügigkeit Lohnschutz "
+    "Beihilfen Ausnahme Verfahren Kommission Bundesrat Parlament Referendum "
+    "gemäss gilt sieht vor dass die der und wird nach in für mit"
+).split()
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model for benchmarks and load tests.
+
+    The answer depends only on the prompt. It cites the retrieved documents
+    with [n] markers like the real model does, and the response time is
+    latency + answer_tokens / tokens_per_second.
+    """
+
+    latency: float = 0.2
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+
+        if "Chatverlauf:" in prompt:
+            # Question generator: return the follow-up question unchanged
+            questions = re.findall(r"Frage: (.*)", prompt)
+            text = questions[-1].strip() if questions else prompt[-200:]
+            n_tokens = len(text.split())
+        else:
+            text = self._answer(prompt)
+            n_tokens = self.answer_tokens
+
+        delay = self.latency
+        if self.tokens_per_second > 0:
+            delay += n_tokens / self.tokens_per_second
+        time.sleep(delay)
+
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _answer(self, prompt: str) -> str:
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16], 16)
+        rng = random.Random(seed)
+        n_docs = max(prompt.count("Quelle:"), 1)
+
+        words = [rng.choice(_WORDS) for _ in range(self.answer_tokens)]
+        # Cite up to three documents, spread over the answer
+        n_citations = min(3, n_docs)
+        cited = rng.sample(range(1, n_docs + 1), n_citations)
+        step = max(len(words) // n_citations, 1)
+        for i, doc_num in enumerate(cited):
+            pos = min((i + 1) * step - 1, len(words) - 1)
+            words[pos] = f"{words[pos]} [{doc_num}]"
+        return " ".join(words) + "."
@@ -0,0 +1,119 @@
+"""
+Wie viel doppelter Text landet im Kontext der Antworten? Vergleich eines
+Index ohne Deduplizierung (DEDUP_THRESHOLD=0) mit einem deduplizierten Index.
+
+Für einen festen Fragensatz werden die top-k Chunks geholt; ein Treffer gilt
+als Duplikat, wenn er einem höher gerankten Treffer derselben Frage nahezu
+gleicht (gleiches MinHash-Kriterium wie beim Build). Ausgegeben werden der
+Anteil doppelter Chunks und Zeichen im Kontext sowie Vektoren und Grösse des Index.
+
+    PYTHONPATH=. python bench/dedup_context.py --plain <index ohne Dedup> --dedup <index mit Dedup>
+
+--encoder index (Standard) bettet die Fragen mit dem Modell des Index ein und
+sucht im FAISS-Index. --encoder tfidf sucht stattdessen mit TF-IDF über die
+Chunk-Texte, z.B. ohne Zugriff auf das Sentence-Transformer-Modell.
+"""
+import argparse
+import os
+
+import numpy as np
+
+from app.services.compact_store import CompactDocstore
+from vector.dedup import minhash
+from vector.preprocess import DEDUP_THRESHOLD, EMBEDDING_MODEL
+
+QUESTIONS = [
+    "Was ist die Guillotine-Klausel?",
+    "Wie funktioniert die dynamische Rechtsübernahme?",
+    "Welche Rolle spielt der Europäische Gerichtshof bei der Streitbeilegung?",
+    "Wie wird der Lohnschutz in der Schweiz gesichert?",
+    "Was regelt das Stromabkommen?",
+    "Welche Ausnahmen gibt es bei der Unionsbürgerrichtlinie?",
+    "Was ändert sich bei den staatlichen Beihilfen?",
+    "Wie hoch ist der Kohäsionsbeitrag der Schweiz?",
+    "Welche Schutzklausel gibt es bei der Zuwanderung?",
+    "Was bedeutet das Abkommen für den Landverkehr?",
+    "Wie ist das Lebensmittelsicherheitsabkommen aufgebaut?",
+    "An welchen EU-Programmen kann die Schweiz teilnehmen?",
+    "Was steht im Gesundheitsabkommen?",
+    "Wie funktioniert das Schiedsgericht?",
+    "Welche Bundesbeschlüsse braucht es für die Umsetzung?",
+    "Was passiert, wenn die Schweiz eine Rechtsentwicklung nicht übernimmt?",
+    "Welche Regeln gelten für den Luftverkehr?",
+    "Was sind Ausgleichsmassnahmen?",
+    "Wie wird die Spesenregelung für entsandte Arbeitnehmende gehandhabt?",
+    "Was ist das Ziel des Pakets Schweiz–EU?",
+]
+
+
+class IndexSearch:
+    def __init__(self, path, docstore):
+        import faiss
+        from sentence_transformers import SentenceTransformer
+        self.index = faiss.read_index(os.path.join(path, "index.faiss"))
+        self.model = SentenceTransformer(EMBEDDING_MODEL)
+
+    def search(self, question, k):
+        vector = self.model.encode([question], convert_to_numpy=True).astype(np.float32)
+        return [int(i) for i in self.index.search(vector, k)[1][0] if i != -1]
+
+
+class TfidfSearch:
+    def __init__(self, path, docstore):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        self.vectorizer = TfidfVectorizer(sublinear_tf=True)
+        self.matrix = self.vectorizer.fit_transform(docstore.texts[i] for i in range(len(docstore)))
+
+    def search(self, question, k):
+        scores = (self.matrix @ self.vectorizer.transform([question]).T).toarray().ravel()
+        return [int(i) for i in np.argsort(-scores, kind="stable")[:k]]
+
+
+def directory_size_mb(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 1024 / 1024
+
+
+def measure(path, encoder, k):
+    docstore = CompactDocstore(path)
+    searcher = (IndexSearch if encoder == "index" else TfidfSearch)(path, docstore)
+    chunks = chars = duplicate_chunks = duplicate_chars = 0
+    for question in QUESTIONS:
+        seen = []
+        for i in searcher.search(question, k):
+            text = docstore.texts[i]
+            signature = minhash(text)
+            chunks += 1
+            chars += len(text)
+            if any(float(np.mean(signature == s)) >= DEDUP_THRESHOLD for s in seen):
+                duplicate_chunks += 1
+                duplicate_chars += len(text)
+            seen.append(signature)
+    return {
+        "vectors": len(docstore),
+        "size_mb": directory_size_mb(path),
+        "duplicate_chunks": duplicate_chunks / chunks,
+        "duplicate_chars": duplicate_chars / chars,
+        "chars_per_context": chars / len(QUESTIONS),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Doppelter Kontext mit und ohne Deduplizierung")
+    parser.add_argument("--plain", required=True, help="Index ohne Deduplizierung")
+    parser.add_argument("--dedup", required=True, help="Deduplizierter Index")
+    parser.add_argument("--encoder", choices=["index", "tfidf"], default="index")
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{len(QUESTIONS)} Fragen, k={args.k}, Suche: {args.encoder}, Schwelle {DEDUP_THRESHOLD}\n")
+    print(f"{'Index':<10}{'Vektoren':>10}{'MB':>8}{'dopp. Chunks':>14}{'dopp. Zeichen':>15}{'Zeichen/Kontext':>17}")
+    for name, path in (("ohne", args.plain), ("mit", args.dedup)):
+        r = measure(path, args.encoder, args.k)
+        print(
+            f"{name:<10}{r['vectors']:>10}{r['size_mb']:>8.1f}{r['duplicate_chunks']:>14.1%}"
+            f"{r['duplicate_chars']:>15.1%}{r['chars_per_context']:>17.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Vergleich pickled FAISS-Docstore (index.pkl) vs. kompakter Docstore:
+Ladezeit, RSS nach dem Laden und Zeit für eine top-k-Suche inkl. Documents.
+
+Das bestehende Pickle-Verzeichnis wird bei Bedarf in ein Vergleichsverzeichnis
+konvertiert. Jede Variante läuft in einem eigenen Prozess:
+
+    PYTHONPATH=. python bench/docstore.py [--index ./app/data/vectorstore_index]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / 1024 if sys.platform == "darwin" else maxrss / 1024
+
+
+def run_child(mode, path, k, queries):
+    # Alle Bibliotheken vor der ersten RSS-Messung laden, damit nur der Index zählt
+    import faiss  # noqa: F401
+    import numpy as np
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.services.compact_store import load_compact_vectorstore
+
+    embeddings = DeterministicFakeEmbedding(size=384)
+    rss_before = current_rss_mb()
+
+    started = time.perf_counter()
+    if mode == "pickle":
+        vectorstore = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    else:
+        vectorstore = load_compact_vectorstore(path, embeddings)
+    load_seconds = time.perf_counter() - started
+    rss_after = current_rss_mb()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((queries, vectorstore.index.d)).astype(np.float32)
+    started = time.perf_counter()
+    for vector in vectors:
+        docs = vectorstore.similarity_search_by_vector(vector.tolist(), k=k)
+        assert len(docs) == k
+    query_ms = (time.perf_counter() - started) / queries * 1000
+
+    return {
+        "mode": mode,
+        "load_seconds": load_seconds,
+        "rss_delta_mb": rss_after - rss_before,
+        "query_ms": query_ms,
+        "chunks": vectorstore.index.ntotal,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index", default="./app/data/vectorstore_index", help="Pickle-Index (index.faiss + index.pkl)")
+    parser.add_argument("--compact", help="Kompakter Index (Standard: <index>-compact, wird erzeugt)")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--child", choices=["pickle", "compact"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    compact_path = args.compact or args.index.rstrip("/") + "-compact"
+
+    if args.child:
+        path = args.index if args.child == "pickle" else compact_path
+        print(json.dumps(run_child(args.child, path, args.k, args.queries)))
+        return
+
+    from app.services.compact_store import convert_pickle_store, is_compact_store
+    if not is_compact_store(compact_path):
+        print(f"Konvertiere {args.index} → {compact_path}")
+        convert_pickle_store(args.index, compact_path)
+
+    results = []
+    for mode in ("pickle", "compact"):
+        cmd = [
+            sys.executable, __file__, "--child", mode, "--index", args.index,
+            "--compact", compact_path, "-k", str(args.k), "--queries", str(args.queries),
+        ]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{results[0]['chunks']} Chunks, k={args.k}\n")
+    print(f"{'Format':<10}{'Laden s':>10}{'RSS +MB':>10}{'Suche ms':>10}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['load_seconds']:>10.2f}{r['rss_delta_mb']:>10.0f}{r['query_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Mikrobenchmark Spracherkennung: Kosten pro Aufruf und Genauigkeit auf kurzen
+Fragen, neues Backend (py3langid, auf de/fr/it/en beschränkt) vs. langdetect.
+
+    PYTHONPATH=. python bench/language.py [--repeat 200]
+
+"mit Session" verwendet für Folgefragen die Sprache der Session wie /ask.
+"""
+import argparse
+import time
+
+from app.services import language
+from app.services.language import DEFAULT_LANGUAGE, LANGUAGES, classify_language, detect_language
+
+# (Frage, erwartete Sprache, Sprache der Session oder None für die erste Frage)
+QUESTIONS = [
+    ("Was ist die Guillotine-Klausel?", "de", None),
+    ("Was bedeutet dynamische Rechtsübernahme für die Schweiz?", "de", None),
+    ("Wie funktioniert das Streitbeilegungsverfahren?", "de", None),
+    ("Und was heisst das für den Lohnschutz?", "de", "de"),
+    ("und die Schweiz?", "de", "de"),
+    ("Lohnschutz?", "de", "de"),
+    ("Wieso?", "de", "de"),
+    ("Stromabkommen", "de", "de"),
+    ("EU?", "de", "de"),
+    ("ok", "de", "de"),
+    ("Qu'est-ce que la clause guillotine?", "fr", None),
+    ("Quelles sont les conséquences pour la protection des salaires?", "fr", None),
+    ("Comment fonctionne le règlement des différends?", "fr", None),
+    ("et la Suisse?", "fr", "fr"),
+    ("Pourquoi?", "fr", "fr"),
+    ("Et l'accord sur l'électricité?", "fr", "fr"),
+    ("Lohnschutz?", "fr", "fr"),
+    ("Cosa prevede l'accordo sulla libera circolazione?", "it", None),
+    ("Che cosa significa la ripresa dinamica del diritto?", "it", None),
+    ("e la Svizzera?", "it", "it"),
+    ("Perché?", "it", "it"),
+    ("E per i salari?", "it", "it"),
+    ("What is the guillotine clause?", "en", None),
+    ("How does dispute settlement work under the agreement?", "en", None),
+    ("and Switzerland?", "en", "en"),
+    ("Why?", "en", "en"),
+    ("What about wages?", "en", "en"),
+    # Sprachwechsel innerhalb einer Session
+    ("Pouvez-vous répondre en français, s'il vous plaît?", "fr", "de"),
+    ("Can you explain this again in English please?", "en", "de"),
+]
+
+
+def time_per_call(fn, texts, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - started) / (repeat * len(texts)) * 1e6
+
+
+def accuracy(predict):
+    correct = sum(predict(q, session) == expected for q, expected, session in QUESTIONS)
+    return correct / len(QUESTIONS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Spracherkennung")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    texts = [q for q, _, _ in QUESTIONS]
+
+    uncached = language._classify.__wrapped__
+    print(f"{len(QUESTIONS)} kurze Fragen, Sprachen {', '.join(LANGUAGES)}\n")
+    print(f"{'Variante':<28}{'µs/Aufruf':>12}{'Genauigkeit':>14}")
+
+    cost = time_per_call(lambda t: uncached(" ".join(t.split())), texts, args.repeat)
+    print(f"{'py3langid ohne Cache':<28}{cost:>12.1f}{accuracy(lambda q, s: classify_language(q)[0]):>14.1%}")
+    cost = time_per_call(detect_language, texts, args.repeat)
+    print(f"{'py3langid mit Cache':<28}{cost:>12.1f}{'':>14}")
+    print(f"{'py3langid mit Session':<28}{'':>12}{accuracy(detect_language):>14.1%}")
+
+    try:
+        from langdetect import DetectorFactory, LangDetectException, detect
+    except ImportError:
+        print("langdetect nicht installiert, Vergleich übersprungen")
+        return
+    DetectorFactory.seed = 0
+
+    def old_detect(text):
+        # Verhalten vor der Umstellung
+        try:
+            lang = detect(text)
+            if lang in LANGUAGES:
+                return lang
+        except LangDetectException:
+            pass
+        return DEFAULT_LANGUAGE
+
+    cost = time_per_call(old_detect, texts, max(1, args.repeat // 20))
+    print(f"{'langdetect':<28}{cost:>12.1f}{accuracy(lambda q, s: old_detect(q)):>14.1%}")
+
+
+if __name__ == "__main__":
+    main()
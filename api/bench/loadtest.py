@@ -0,0 +1,245 @@
+"""
+Load generator for the API.
+
+Drives /ask, /feed and /conversations/share at a fixed concurrency and reports
+p50/p95/p99 latency and requests per second per endpoint.
+
+Without --url the app is started in-process with the stub LLM, stub embeddings,
+a temporary index of synthetic chunks embedded with the stub embeddings and a
+temporary SQLite database, so the run is fully offline and free:
+
+    PYTHONPATH=. python bench/loadtest.py --concurrency 16 --duration 30
+
+With --url an already running server is targeted instead (its own backends apply).
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+QUESTIONS = [
+    "Was regelt das Abkommen zur Personenfreizügigkeit?",
+    "Wie funktioniert die Streitbeilegung mit dem Schiedsgericht?",
+    "Welche Ausnahmen gibt es beim Lohnschutz?",
+    "Was bedeutet die dynamische Rechtsübernahme?",
+    "Wie hoch ist der Schweizer Beitrag?",
+    "Was ändert sich beim Stromabkommen?",
+    "Quelles sont les règles sur les aides d'État?",
+    "What does the health agreement cover?",
+]
+
+FOLLOW_UPS = [
+    "Und was gilt für Grenzgänger?",
+    "Kannst du das genauer erklären?",
+    "Gibt es dazu eine Übergangsfrist?",
+]
+
+# Size of the temporary index, about as many chunks as the real corpus
+INDEX_CHUNKS = 2500
+INDEX_WORDS = (
+    "Abkommen Schweiz EU Lohnschutz Schiedsgericht Rechtsübernahme Personenfreizügigkeit "
+    "Strom Beihilfen Zuwanderung Landverkehr Luftverkehr Gesundheit Programme Beitrag "
+    "Ausnahme Übergangsfrist Grenzgänger Bundesrat Parlament Umsetzung Binnenmarkt"
+).split()
+
+
+def build_stub_index(path):
+    """Writes a compact index of synthetic chunks, embedded with the stub embeddings."""
+    import faiss
+    import numpy as np
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from app.services.compact_store import CompactStoreWriter
+
+    rng = random.Random(0)
+    texts = [" ".join(rng.choices(INDEX_WORDS, k=120)) for _ in range(INDEX_CHUNKS)]
+    vectors = np.asarray(DeterministicFakeEmbedding(size=384).embed_documents(texts), dtype=np.float32)
+    writer = CompactStoreWriter(path)
+    for i, text in enumerate(texts):
+        writer.add(text, {"source": f"/contracts/dokument_{i // 50}.html#abschnitt-{i % 50}", "category": "abkommen"})
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    writer.close(index)
+
+
+def start_local_server():
+    """Starts the app in a background thread with offline backends."""
+    tmp_dir = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ.setdefault("LLM_BACKEND", "stub")
+    os.environ.setdefault("EMBEDDING_BACKEND", "stub")
+    # All simulated clients share one IP, so the per-client rate limit is off
+    os.environ.setdefault("ASK_RATE_LIMIT_PER_MINUTE", "0")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'loadtest.db')}"
+    os.environ["SESSION_STORE_URL"] = os.path.join(tmp_dir, "session_store.db")
+    # Only index.pkl of the real index is in the repository; a set
+    # VECTORSTORE_PATH (e.g. a locally built index) is used as is
+    if "VECTORSTORE_PATH" not in os.environ:
+        index_path = os.path.join(tmp_dir, "vectorstore_index")
+        build_stub_index(index_path)
+        os.environ["VECTORSTORE_PATH"] = index_path
+
+    from werkzeug.serving import make_server
+    from app import create_app, db
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Lokaler Server auf Port {server.port}, DB in {tmp_dir}, Index in {os.environ['VECTORSTORE_PATH']}")
+    return f"http://127.0.0.1:{server.port}", server
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+class LoadGenerator:
+    def __init__(self, base_url, mix, follow_up_ratio, skip_storage):
+        self.base_url = base_url
+        self.mix = mix
+        self.follow_up_ratio = follow_up_ratio
+        self.skip_storage = skip_storage
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, started, ok):
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def ask(self, http, rng, sessions):
+        payload = {"skip_storage": self.skip_storage}
+        if sessions and rng.random() < self.follow_up_ratio:
+            endpoint = "/ask (follow-up)"
+            payload["question"] = rng.choice(FOLLOW_UPS)
+            payload["session_id"] = rng.choice(sessions)
+        else:
+            endpoint = "/ask"
+            payload["question"] = rng.choice(QUESTIONS)
+
+        started = time.perf_counter()
+        try:
+            resp = http.post(f"{self.base_url}/ask", json=payload, timeout=120)
+            ok = resp.status_code == 200
+            if ok and "session_id" not in payload:
+                sessions.append(resp.json()["session_id"])
+        except requests.RequestException:
+            ok = False
+        self.record(endpoint, started, ok)
+
+    def feed(self, http, rng, sessions):
+        started = time.perf_counter()
+        try:
+            ok = http.get(f"{self.base_url}/feed", timeout=60).status_code == 200
+        except requests.RequestException:
+            ok = False
+        self.record("/feed", started, ok)
+
+    def share(self, http, rng, sessions):
+        if not sessions or self.skip_storage:
+            # Nothing stored to share yet
+            return self.ask(http, rng, sessions)
+        started = time.perf_counter()
+        try:
+            resp = http.post(
+                f"{self.base_url}/conversations/share",
+                json={"session_id": rng.choice(sessions), "posted_in_feed": True},
+                timeout=60,
+            )
+            ok = resp.status_code == 200
+        except requests.RequestException:
+            ok = False
+        self.record("/conversations/share", started, ok)
+
+    def worker(self, worker_id, deadline, max_requests):
+        rng = random.Random(worker_id)
+        http = requests.Session()
+        sessions = []
+        actions = [getattr(self, name) for name in self.mix]
+        weights = list(self.mix.values())
+        done = 0
+        while time.perf_counter() < deadline and (max_requests is None or done < max_requests):
+            rng.choices(actions, weights)[0](http, rng, sessions)
+            done += 1
+
+    def run(self, concurrency, duration, max_requests):
+        deadline = time.perf_counter() + duration
+        per_worker = None if max_requests is None else max(1, max_requests // concurrency)
+        threads = [
+            threading.Thread(target=self.worker, args=(i, deadline, per_worker))
+            for i in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - started
+
+    def report(self, elapsed):
+        print(f"\n{'Endpoint':<24}{'Anzahl':>8}{'Fehler':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        total = 0
+        for endpoint in sorted(self.latencies):
+            values = sorted(self.latencies[endpoint])
+            total += len(values)
+            print(
+                f"{endpoint:<24}{len(values):>8}{self.errors[endpoint]:>8}"
+                f"{len(values) / elapsed:>9.1f}"
+                f"{percentile(values, 50) * 1000:>10.0f}"
+                f"{percentile(values, 95) * 1000:>10.0f}"
+                f"{percentile(values, 99) * 1000:>10.0f}"
+            )
+        print(f"\nGesamt: {total} Requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        if name not in ("ask", "feed", "share"):
+            raise argparse.ArgumentTypeError(f"Unbekannter Endpoint: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Laufenden Server testen statt lokal zu starten")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="Sekunden")
+    parser.add_argument("--requests", type=int, help="Maximale Anzahl Requests (statt nur Dauer)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("ask=6,feed=3,share=1"))
+    parser.add_argument("--follow-up-ratio", type=float, default=0.3)
+    parser.add_argument("--skip-storage", action="store_true")
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        base_url, server = start_local_server()
+
+    generator = LoadGenerator(base_url, args.mix, args.follow_up_ratio, args.skip_storage)
+    print(f"Starte Lasttest gegen {base_url} mit {args.concurrency} parallelen Clients")
+    elapsed = generator.run(args.concurrency, args.duration, args.requests)
+    generator.report(elapsed)
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
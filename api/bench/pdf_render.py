@@ -0,0 +1,210 @@
+"""
+Vergleich des bisherigen BeautifulSoup-Renderers mit dem streamenden Renderer
+aus vector/preprocess.py: Laufzeit, Peak-RSS und Grösse der HTML-Dateien.
+
+Jede Variante läuft in einem eigenen Prozess, damit der Peak-RSS vergleichbar ist:
+
+    PYTHONPATH=. python bench/pdf_render.py [--limit 10]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import fitz
+from bs4 import BeautifulSoup
+
+from vector.preprocess import PDF_DIR, make_html_path, make_html_title, render_pdf
+
+
+def legacy_pdf_to_html(html_title, pdf_path, html_path, out_dir):
+    """
+    Bisheriger Renderer (BeautifulSoup-Baum, ein Tag pro Span) als Vergleichsbasis.
+    """
+    doc = fitz.open(pdf_path)
+    html = BeautifulSoup(
+        f"<!DOCTYPE html><html><head>"
+        f"<meta charset='utf-8'><title>{html_title}</title>"
+        f"<meta name='viewport' content='width=device-width, initial-scale=1'>"
+        f"<link rel='stylesheet' href='/static.css'>"
+        "</head><body></body></html>",
+        "html.parser"
+    )    
+
+    body = html.body
+
+    text_container = html.new_tag("div", **{"class": "text-container"})
+
+    # Header-Container
+    header = html.new_tag("div", **{"class": "header"})
+    # Logo-Link
+    logo = html.new_tag("a", href="/", **{"class": "logo"})
+    img = html.new_tag("img", src="/logo-colored.webp", alt="Logo", width="28", height="28")
+    title = html.new_tag("div"); title.string = "Rahmenabkommen GPT"
+    logo.append(img); logo.append(title)
+    header.append(logo)
+
+    # Help icon
+    help = html.new_tag('a', href="/help", dataDiscover="true", **{"class": "help-button"})
+    help_icon = html.new_tag('svg', xmlns="http://www.w3.org/2000/svg", width="26", height="26", fill="currentColor", viewBox="0 0 256 256")
+    help_icon_path = html.new_tag('path', d="M140,180a12,12,0,1,1-12-12A12,12,0,0,1,140,180ZM128,72c-22.06,0-40,16.15-40,36v4a8,8,0,0,0,16,0v-4c0-11,10.77-20,24-20s24,9,24,20-10.77,20-24,20a8,8,0,0,0-8,8v8a8,8,0,0,0,16,0v-.72c18.24-3.35,32-17.9,32-35.28C168,88.15,150.06,72,128,72Zm104,56A104,104,0,1,1,128,24,104.11,104.11,0,0,1,232,128Zm-16,0a88,88,0,1,0-88,88A88.1,88.1,0,0,0,216,128Z")
+    help_icon.append(help_icon_path)
+    help.append(help_icon)
+    header.append(help)
+
+    ask_container = html.new_tag("div", **{"class": "ask-button-container"})
+    ask_button = html.new_tag("a", href="/"); 
+    ask_text = html.new_tag("div"); ask_text.string = "Stelle deine eigenen Fragen"
+    ask_icon = html.new_tag('svg', xmlns="http://www.w3.org/2000/svg", width="26", height="26", fill="currentColor", viewBox="0 0 256 256")
+    ask_icon_path = html.new_tag('path', d="M216,48H40A16,16,0,0,0,24,64V224a15.84,15.84,0,0,0,9.25,14.5A16.05,16.05,0,0,0,40,240a15.89,15.89,0,0,0,10.25-3.78l.09-.07L83,208H216a16,16,0,0,0,16-16V64A16,16,0,0,0,216,48ZM40,224h0ZM216,192H80a8,8,0,0,0-5.23,1.95L40,224V64H216Z")
+
+    ask_icon.append(ask_icon_path)
+    ask_button.append(ask_icon)
+    ask_button.append(ask_text)
+    ask_container.append(ask_button)
+    body.append(ask_container)
+
+    # Dark-Mode-Button
+    #dm_btn = html.new_tag("button", **{"aria-label": "Toggle dark mode" })
+    #dm_btn.append(BeautifulSoup(darkmode_svg, "html.parser"))
+    #header.append(dm_btn)
+
+    body.append(header)    
+    body.append(text_container)    
+    # ID-Counter für Referenzen
+    counters = {"h1": 0, "h2": 0, "p": 0}
+
+    for page_num, page in enumerate(doc, start=1):
+        # Optional: Kapitel-Header pro Seite
+        page_header = html.new_tag("h2")
+        counters["h2"] += 1
+        if not page_header.get('id'):
+            page_header['id'] = f"h{counters['h2']}"
+        text_container.append(page_header)
+
+        # Textblöcke im „dict“-Format
+        page_dict = page.get_text("dict")
+        for block in page_dict["blocks"]:
+            if block["type"] != 0: 
+                continue  # nur Text-Blöcke
+
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    text = span["text"].strip()
+                    if not text:
+                        continue
+                    size = span["size"]
+                    # Schwellen für Überschriften (anpassen!)
+                    if size >= 16:
+                        tag_name = "h1"
+                    elif size >= 12:
+                        tag_name = "h2"
+                    else:
+                        tag_name = "p"
+                    tag = html.new_tag(tag_name)
+                    tag.string = text
+                    # ID hinzufügen, wenn nicht vorhanden
+                    if not tag.get('id'):
+                        counters[tag_name] += 1
+                        tag['id'] = f"p{counters[tag_name]}"
+
+                    text_container.append(tag)
+
+    # Schreibe die Datei
+    out_path = os.path.join(out_dir, html_path)
+    os.makedirs(out_dir, exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write(str(html))
+    print(f"[HTML] {pdf_path} → {out_path}")
+    return html
+
+def legacy_extract_text_with_mapping(soup):
+    text = ""
+    mapping = []
+    current_pos = 0
+
+    for element in soup.find_all(['span', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        element_text = element.get_text()
+        start = current_pos
+        end = start + len(element_text)
+        mapping.append((start, end, element['id']))
+        text += element_text + "\n"
+        current_pos = end + 1  # +1 für die neue Zeile
+    return text, mapping
+
+
+def peak_rss_mb():
+    # ru_maxrss ist unter Linux in KiB, unter macOS in Bytes
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / 1024 if sys.platform == "darwin" else maxrss / 1024
+
+
+def run_mode(mode, pdf_paths, out_dir):
+    # Die Importe (vector.preprocess lädt sentence_transformers/torch) belegen
+    # bereits mehrere hundert MB; verglichen wird der Zuwachs beim Rendern
+    baseline_rss_mb = peak_rss_mb()
+    started = time.perf_counter()
+    text_chars = 0
+    elements = 0
+    for pdf_path in pdf_paths:
+        html_title = make_html_title(pdf_path)
+        html_path = make_html_path(pdf_path)
+        if mode == "legacy":
+            soup = legacy_pdf_to_html(html_title, pdf_path, html_path, out_dir)
+            text, mapping = legacy_extract_text_with_mapping(soup)
+        else:
+            text, mapping = render_pdf(html_title, pdf_path, html_path, out_dir)
+        text_chars += len(text)
+        elements += len(mapping)
+    elapsed = time.perf_counter() - started
+
+    html_bytes = sum(os.path.getsize(os.path.join(out_dir, f)) for f in os.listdir(out_dir))
+    return {
+        "mode": mode,
+        "seconds": elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_growth_mb": peak_rss_mb() - baseline_rss_mb,
+        "html_bytes": html_bytes,
+        "elements": elements,
+        "text_chars": text_chars,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, help="Nur die ersten N PDFs verwenden")
+    parser.add_argument("--child", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    pdf_paths = sorted(os.path.join(PDF_DIR, f) for f in os.listdir(PDF_DIR) if f.endswith(".pdf"))
+    if args.limit:
+        pdf_paths = pdf_paths[:args.limit]
+
+    if args.child:
+        with tempfile.TemporaryDirectory() as out_dir:
+            print(json.dumps(run_mode(args.child, pdf_paths, out_dir)))
+        return
+
+    results = []
+    for mode in ("legacy", "streaming"):
+        cmd = [sys.executable, __file__, "--child", mode]
+        if args.limit:
+            cmd += ["--limit", str(args.limit)]
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{len(pdf_paths)} PDFs\n")
+    print(f"{'Variante':<12}{'Zeit s':>10}{'Peak-RSS MB':>14}{'davon Rendern':>15}{'HTML MB':>10}{'Elemente':>10}")
+    for r in results:
+        print(
+            f"{r['mode']:<12}{r['seconds']:>10.1f}{r['peak_rss_mb']:>14.0f}{r['rss_growth_mb']:>15.0f}"
+            f"{r['html_bytes'] / 1024 / 1024:>10.1f}{r['elements']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
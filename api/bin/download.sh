@@ -3,6 +3,10 @@
 # Lädt PDFs von https://www.europa.eda.admin.ch/de/vernehmlassung-paket-schweiz-eu
 # herunter und benennt sie richtig!
 #
+# Downloads laufen parallel und bedingt (ETag/If-Modified-Since aus
+# app/data/pdfs/manifest.json); abgebrochene Downloads werden fortgesetzt und
+# Dateien mit unverändertem Inhalt nicht neu geschrieben.
+#
 # Voraussetzung:
 # - Playright muss installiert sein:
 #   - pip install playwright
@@ -0,0 +1,19 @@
+#!/bin/sh
+#
+# Lasttest für die API
+#
+# Startet die App lokal mit Stub-LLM, Stub-Embeddings und temporärer SQLite-DB
+# (komplett offline, keine OpenAI-Kosten) und belastet /ask, /feed und
+# /conversations/share. Ausgegeben werden p50/p95/p99-Latenzen und Requests/s.
+#
+# Nutzung:
+#   ./bin/loadtest.sh --concurrency 16 --duration 30
+#   ./bin/loadtest.sh --url http://localhost:8000   # laufenden Server testen
+#
+# Die Stub-Latenz lässt sich über STUB_LLM_LATENCY, STUB_LLM_TOKENS_PER_SECOND
+# und STUB_LLM_ANSWER_TOKENS einstellen.
+#
+
+cd "$(dirname "$0")/.."
+
+PYTHONPATH=$(pwd) python bench/loadtest.py "$@"
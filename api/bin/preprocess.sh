@@ -6,6 +6,16 @@
 # das die folgenden Aufgaben übernimmt:
 # - Extraktion und Zerlegung von Text aus den PDF-Vertragsdokumenten
 # - Vorverarbeitung und Speicherung der Text-Chunks für die spätere Einbettung
+# - Speichern von FAISS-Index und kompaktem Docstore (siehe app/services/compact_store.py)
+# - Speichern als neue Index-Version unter app/data/vectorstore_index/versions/ und
+#   Umschalten von CURRENT; laufende Server übernehmen sie ohne Neustart
+#   (Prüfintervall INDEX_POLL_INTERVAL, siehe app/services/index_versions.py)
+# - Chunks werden in Batches (EMBED_BATCH_SIZE) eingebettet und direkt auf Platte
+#   geschrieben; ein abgebrochener Build wird beim nächsten Aufruf nach dem
+#   letzten fertigen PDF fortgesetzt
+# - Nahezu identische Chunks (z.B. Vertragstext in Abkommen und Faktenblatt) werden
+#   nur einmal eingebettet, die weiteren Fundstellen bleiben als alternative Quellen
+#   erhalten (DEDUP_THRESHOLD, siehe vector/dedup.py)
 #
 # Voraussetzung:
 # - Die Python Virtual Environment muss bereits aktiviert sein (siehe `activate.sh`)
@@ -19,4 +29,4 @@
 
 cd "$(dirname "$0")/.."
 
-python vector/preprocess.py
+PYTHONPATH=$(pwd) python vector/preprocess.py
@@ -5,7 +5,10 @@
 # Dieses Script:
 # - Wechselt in das Projekt-Root-Verzeichnis
 # - Setzt den PYTHONPATH auf das aktuelle Verzeichnis
-# - Startet Gunicorn mit 4 Worker-Prozessen
+# - Startet Gunicorn mit 4 Worker-Prozessen à 8 Threads (gthread), damit
+#   gleichzeitige identische Fragen innerhalb eines Workers zusammengefasst werden.
+#   /ask belegt pro Worker höchstens ASK_MAX_ACTIVE (6) Threads, die übrigen
+#   bleiben für /feed, /stats, /sitemap.xml usw. frei.
 # - Bindet den Server an alle Interfaces auf Port 8000
 # - Lädt die Flask-App aus main:app
 #
@@ -14,7 +17,7 @@
 
 cd "$(dirname "$0")/.."
 
-PYTHONPATH=$(pwd) gunicorn -w 4 -b 0.0.0.0:8000 main:app
+PYTHONPATH=$(pwd) gunicorn -w 4 --threads 8 -b 0.0.0.0:8000 main:app
 
 #Debug:
 #PYTHONPATH=$(pwd) gunicorn -w 4 -b 0.0.0.0:8000  "app:create_app()"
@@ -84,7 +84,7 @@ echo "✅ Virtual environment activated."
 pip install --upgrade pip wheel setuptools
 
 # Wichtige Core-Pakete explizit installieren
-pip install flask flask-cors flask-sqlalchemy flask-migrate python-dotenv pymupdf gunicorn langdetect langchain langchain-community sentence_transformers openai
+pip install flask flask-cors flask-sqlalchemy flask-migrate python-dotenv pymupdf gunicorn py3langid langchain langchain-community sentence_transformers openai
 
 # Faiss, Numpy, etc. Installation je nach OS/Arch
 pip install $SPECIFIC_PIP_PACKAGES
@@ -0,0 +1,180 @@
+"""
+Prüft download_all() gegen einen lokalen HTTP-Server statt der echten Website:
+
+- erster Download (200) und bedingter Folgelauf (304),
+- Fortsetzen einer abgebrochenen .part-Datei per Range-Request (206),
+- neuer ETag bei gleichem Inhalt: Datei bleibt unangetastet ("unchanged"),
+- Schreibfehler bei einer Datei: nur diese ist "failed", die anderen laufen durch,
+- doppelt verlinkte Dateien werden nur einmal geladen,
+- 503 wird nur von download_file() wiederholt (eine Retry-Ebene).
+
+    python download/check_download.py
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import download
+from download import create_session, download_all, load_manifest
+
+LAST_MODIFIED = "Wed, 01 Oct 2025 08:00:00 GMT"
+
+
+class FakeSite:
+    """Inhalt, ETag und Protokoll der Requests des lokalen Servers."""
+
+    def __init__(self):
+        self.files = {}
+        self.requests = []
+        self.failures = {}  # Pfad -> Anzahl 503-Antworten vor dem Erfolg
+        self.lock = threading.Lock()
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with site.lock:
+                    site.requests.append((self.path, self.headers.get("If-None-Match"), self.headers.get("Range")))
+                    body, etag = site.files.get(self.path, (None, None))
+                    fail = site.failures.get(self.path, 0)
+                    if fail:
+                        site.failures[self.path] = fail - 1
+                if fail:
+                    self.send_error(503)
+                    return
+                if body is None:
+                    self.send_error(404)
+                    return
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+
+                status, start = 200, 0
+                range_header = self.headers.get("Range")
+                if range_header and self.headers.get("If-Range") == etag:
+                    status, start = 206, int(range_header.split("=")[1].rstrip("-"))
+                self.send_response(status)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", LAST_MODIFIED)
+                self.send_header("Content-Length", str(len(body) - start))
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+                self.end_headers()
+                self.wfile.write(body[start:])
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def requests_for(self, path):
+        with self.lock:
+            return [r for r in self.requests if r[0] == path]
+
+
+failures = []
+
+
+def check(condition, message):
+    print(f"{'ok  ' if condition else 'FEHLER'} {message}")
+    if not condition:
+        failures.append(message)
+
+
+def main():
+    site = FakeSite()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), site.handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}/"
+    download_dir = tempfile.mkdtemp(prefix="download-check-")
+    session = create_session()
+    download.BACKOFF_SECONDS = 0
+
+    abkommen = os.urandom(300 * 1024)
+    bericht = os.urandom(100 * 1024)
+    site.files["/abkommen.pdf"] = (abkommen, '"a1"')
+    site.files["/bericht.pdf"] = (bericht, '"b1"')
+    links = [("Abkommen", "/abkommen.pdf"), ("Bericht", "/bericht.pdf")]
+    abkommen_path = os.path.join(download_dir, "Abkommen.pdf")
+
+    def run():
+        return download_all(links, download_dir, max_workers=2, session=session, base_url=base_url)
+
+    summary = run()
+    check(summary == {"new": 2}, f"erster Lauf lädt beide Dateien: {summary}")
+    with open(abkommen_path, "rb") as f:
+        check(f.read() == abkommen, "Inhalt vollständig")
+
+    summary = run()
+    check(summary == {"not-modified": 2}, f"zweiter Lauf bekommt 304: {summary}")
+    check(site.requests_for("/abkommen.pdf")[-1][1] == '"a1"', "If-None-Match mit dem ETag aus dem Manifest")
+
+    # Neuer ETag, gleicher Inhalt: 200, aber die Datei wird nicht ersetzt
+    site.files["/abkommen.pdf"] = (abkommen, '"a2"')
+    mtime = os.stat(abkommen_path).st_mtime_ns
+    summary = run()
+    check(summary == {"unchanged": 1, "not-modified": 1}, f"gleicher Inhalt trotz neuem ETag: {summary}")
+    check(os.stat(abkommen_path).st_mtime_ns == mtime, "Datei (mtime) unangetastet")
+    check(load_manifest(download_dir)["Abkommen.pdf"]["etag"] == '"a2"', "Manifest hat den neuen ETag")
+
+    # Abgebrochener Download einer geänderten Datei: Fortsetzen ab der .part-Grösse
+    changed = os.urandom(300 * 1024)
+    site.files["/abkommen.pdf"] = (changed, '"a3"')
+    part_path = abkommen_path + ".part"
+    with open(part_path, "wb") as f:
+        f.write(changed[:120 * 1024])
+    with open(part_path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"etag": '"a3"', "last_modified": LAST_MODIFIED}, f)
+    summary = run()
+    check(summary == {"updated": 1, "not-modified": 1}, f"fortgesetzter Download: {summary}")
+    check(site.requests_for("/abkommen.pdf")[-1][2] == f"bytes={120 * 1024}-", "Range ab der .part-Grösse")
+    with open(abkommen_path, "rb") as f:
+        check(f.read() == changed, "fortgesetzte Datei vollständig und korrekt")
+    check(not os.path.exists(part_path) and not os.path.exists(part_path + ".json"), ".part-Dateien aufgeräumt")
+
+    # Schreibfehler (hier: .part ist ein Verzeichnis) betrifft nur diese Datei
+    site.files["/bericht.pdf"] = (os.urandom(100 * 1024), '"b2"')
+    site.files["/abkommen.pdf"] = (abkommen, '"a4"')
+    os.makedirs(os.path.join(download_dir, "Bericht.pdf.part"))
+    summary = run()
+    check(summary == {"failed": 1, "updated": 1}, f"Schreibfehler bricht nur eine Datei ab: {summary}")
+    check(load_manifest(download_dir)["Bericht.pdf"]["etag"] == '"b1"', "Manifest-Eintrag der fehlgeschlagenen Datei bleibt")
+
+    # Gleicher Titel aus Akkordeon und Seitenleiste: nur ein Download
+    site.files["/faq.pdf"] = (os.urandom(50 * 1024), '"f1"')
+    site.files["/faq-aside.pdf"] = site.files["/faq.pdf"]
+    summary = download_all(
+        [("FAQ", "/faq.pdf"), ("FAQ", "/faq-aside.pdf"), ("FAQ", "/faq.pdf")],
+        download_dir, session=session, base_url=base_url,
+    )
+    requested = len(site.requests_for("/faq.pdf")) + len(site.requests_for("/faq-aside.pdf"))
+    check(summary == {"new": 1} and requested == 1, f"doppelter Link nur einmal geladen: {summary}, {requested} Request(s)")
+
+    # Zwei 503, dann Erfolg: drei Requests, keine zusätzlichen Retries im Adapter
+    site.files["/anhang.pdf"] = (os.urandom(50 * 1024), '"h1"')
+    site.failures["/anhang.pdf"] = 2
+    summary = download_all([("Anhang", "/anhang.pdf")], download_dir, session=session, base_url=base_url)
+    requested = len(site.requests_for("/anhang.pdf"))
+    check(summary == {"new": 1} and requested == 3, f"503 zweimal wiederholt: {summary}, {requested} Requests")
+
+    site.failures["/anhang.pdf"] = 10
+    os.remove(os.path.join(download_dir, "Anhang.pdf"))
+    summary = download_all([("Anhang", "/anhang.pdf")], download_dir, session=session, base_url=base_url)
+    requested = len(site.requests_for("/anhang.pdf")) - 3
+    check(summary == {"failed": 1} and requested == download.MAX_ATTEMPTS,
+          f"höchstens MAX_ATTEMPTS Requests pro Datei: {summary}, {requested} Requests")
+
+    server.shutdown()
+    if failures:
+        print(f"\n{len(failures)} Prüfung(en) fehlgeschlagen")
+        sys.exit(1)
+    print("\nAlle Prüfungen bestanden")
+
+
+if __name__ == "__main__":
+    main()
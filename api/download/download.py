@@ -1,10 +1,21 @@
 import os
 import re
+import json
+import time
+import hashlib
 import requests
-from playwright.sync_api import sync_playwright
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
 
 URL = "https://www.europa.eda.admin.ch/de/vernehmlassung-paket-schweiz-eu"
 DOWNLOAD_DIR = "./app/data/pdfs"
+MANIFEST_FILE = "manifest.json"
+
+MAX_WORKERS = 4         # Parallele Downloads
+MAX_ATTEMPTS = 4        # Versuche pro Datei (abgebrochene Downloads werden fortgesetzt)
+BACKOFF_SECONDS = 1.0   # Wartezeit vor dem 2. Versuch, verdoppelt sich danach
+CHUNK_SIZE = 64 * 1024
 
 def sanitize_filename(name: str) -> str:
     # Erlaubte Zeichen für Dateinamen, alles andere entfernen/ersetzen
@@ -63,20 +74,186 @@ def get_download_links_and_titles(page, target_categories=[
             result.append((title, href))
     return result
 
-def download_file(url, filename):
-    print(f"Downloading {url} as {filename}")
-    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-    path = os.path.join(DOWNLOAD_DIR, filename)
+def create_session(pool_size=MAX_WORKERS):
+    """
+    HTTP-Session mit Connection-Pool. Ohne Retries im Adapter: Verbindungsfehler
+    und 429/5xx wiederholt download_file() selbst (MAX_ATTEMPTS, mit Fortsetzen).
+    """
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def load_manifest(download_dir=DOWNLOAD_DIR):
+    path = os.path.join(download_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, download_dir=DOWNLOAD_DIR):
+    path = os.path.join(download_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _read_json(path):
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-    except Exception as e:
-        print(f"Fehler beim Download von {url}: {e}")
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def download_file(session, url, filename, entry=None, download_dir=DOWNLOAD_DIR):
+    """
+    Lädt eine Datei bedingt und fortsetzbar herunter.
+
+    - Mit ETag/Last-Modified aus dem Manifest wird ein bedingter Request gesendet;
+      bei 304 bleibt die Datei unangetastet.
+    - Abgebrochene Downloads bleiben als `.part` liegen und werden per Range-Request
+      fortgesetzt (If-Range stellt sicher, dass sich die Datei nicht geändert hat).
+    - Ist der Inhalt (SHA-256) gleich wie bisher, wird die Datei nicht ersetzt.
+
+    Gibt (status, entry) zurück; status ist "new", "updated", "unchanged",
+    "not-modified" oder "failed".
+    """
+    entry = entry or {}
+    path = os.path.join(download_dir, filename)
+    part_path = path + ".part"
+    part_meta_path = part_path + ".json"
+
+    conditional = {}
+    if os.path.exists(path) and entry.get("url") == url:
+        if entry.get("etag"):
+            conditional["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            conditional["If-Modified-Since"] = entry["last_modified"]
+
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+        headers = dict(conditional)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        part_meta = _read_json(part_meta_path) if offset else {}
+        validator = part_meta.get("etag") or part_meta.get("last_modified")
+        if offset and validator:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=(10, 60)) as response:
+                if response.status_code == 304:
+                    print(f"Unverändert (304): {filename}")
+                    return "not-modified", entry
+
+                if response.status_code == 416:
+                    # Range passt nicht mehr zur Datei: von vorne beginnen
+                    os.remove(part_path)
+                    continue
+
+                response.raise_for_status()
+
+                if response.status_code == 206:
+                    mode = "ab"
+                else:
+                    mode = "wb"
+                    with open(part_meta_path, "w", encoding="utf-8") as f:
+                        json.dump({
+                            "etag": response.headers.get("ETag"),
+                            "last_modified": response.headers.get("Last-Modified"),
+                        }, f)
+
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+
+                etag = response.headers.get("ETag") or part_meta.get("etag")
+                last_modified = response.headers.get("Last-Modified") or part_meta.get("last_modified")
+        except requests.RequestException as e:
+            print(f"Fehler beim Download von {url} (Versuch {attempt + 1}/{MAX_ATTEMPTS}): {e}")
+            continue
+
+        digest = sha256_file(part_path)
+        new_entry = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "sha256": digest,
+            "size": os.path.getsize(part_path),
+        }
+        if os.path.exists(path) and entry.get("sha256") == digest:
+            # Inhalt identisch: Datei (und mtime) nicht anfassen
+            os.remove(part_path)
+            status = "unchanged"
+        else:
+            status = "updated" if os.path.exists(path) else "new"
+            os.replace(part_path, path)
+        if os.path.exists(part_meta_path):
+            os.remove(part_meta_path)
+        print(f"{status}: {filename}")
+        return status, new_entry
+
+    return "failed", entry
+
+def download_all(links_and_titles, download_dir=DOWNLOAD_DIR, max_workers=MAX_WORKERS, session=None, base_url=URL):
+    """
+    Lädt alle (title, url)-Paare parallel herunter und aktualisiert das Manifest.
+    Gibt die Anzahl Dateien pro Status zurück.
+    """
+    os.makedirs(download_dir, exist_ok=True)
+    session = session or create_session(max_workers)
+    manifest = load_manifest(download_dir)
+    summary = {}
+
+    # Dasselbe Dokument kann mehrfach verlinkt sein (Akkordeon und Seitenleiste);
+    # parallele Downloads in dieselbe .part-Datei würden sich gegenseitig zerstören
+    files = {}
+    for title, href in links_and_titles:
+        filename = sanitize_filename(title)
+        url = urljoin(base_url, href)
+        if filename in files:
+            if files[filename] != url:
+                print(f"Warnung: {url} übersprungen, {filename} kommt bereits von {files[filename]}")
+            continue
+        files[filename] = url
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for filename, url in files.items():
+            print(f"Downloading {url} as {filename}")
+            future = executor.submit(download_file, session, url, filename, manifest.get(filename), download_dir)
+            futures[future] = filename
+
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                status, entry = future.result()
+            except Exception as e:
+                # z.B. OSError beim Schreiben der .part-Datei: nur diese Datei gilt als fehlgeschlagen
+                print(f"Fehler beim Download von {filename}: {e}")
+                status, entry = "failed", None
+            if entry:
+                manifest[filename] = entry
+            summary[status] = summary.get(status, 0) + 1
+            # Nach jeder Datei speichern, damit ein Abbruch nichts verliert
+            save_manifest(manifest, download_dir)
+
+    return summary
 
 def main():
+    # Erst hier importieren, damit download_all() ohne Playwright nutzbar/testbar ist
+    from playwright.sync_api import sync_playwright
+
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
@@ -85,11 +262,10 @@ def main():
         links_and_titles = get_download_links_and_titles(page)
         print(f"Gefundene Dokumente: {len(links_and_titles)}")
 
-        for title, url in links_and_titles:
-            filename = sanitize_filename(title)
-            download_file(url, filename)
-
         browser.close()
 
+    summary = download_all(links_and_titles)
+    print(f"Fertig: {summary}")
+
 if __name__ == "__main__":
     main()
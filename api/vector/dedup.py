@@ -0,0 +1,79 @@
+"""
+Erkennung nahezu identischer Chunks mit MinHash und LSH.
+
+Derselbe Vertragstext steht im Abkommen, im Erläuternden Bericht und in den
+Faktenblättern. Jeder Chunk bekommt eine MinHash-Signatur über seine
+Wort-5-Gramme; über LSH-Bänder werden nur ähnliche Kandidaten verglichen.
+Ein Chunk, dessen geschätzte Jaccard-Ähnlichkeit zu einem bereits behaltenen
+Chunk mindestens threshold beträgt, wird nicht eingebettet, sondern nur als
+alternative Quelle dieses Chunks gespeichert.
+"""
+import hashlib
+import re
+
+import numpy as np
+
+NUM_PERM = 128
+# 16 Bänder à 8 Zeilen: Kandidaten ab einer Ähnlichkeit von etwa 0.7
+BANDS = 16
+SHINGLE_WORDS = 5
+
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Feste Permutationen, damit Signaturen zwischen Läufen (Checkpoint) vergleichbar sind
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 32, NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, NUM_PERM, dtype=np.uint64)
+
+
+def shingles(text):
+    words = re.findall(r"\w+", text.casefold())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash(text):
+    """MinHash-Signatur (NUM_PERM x uint32) eines Textes."""
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles(text)),
+        dtype=np.uint64,
+    )
+    # (a * h + b) mod p je Permutation, Minimum über alle Shingles
+    return ((np.outer(hashes, _A) + _B) % _PRIME & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+
+class NearDuplicateIndex:
+    """LSH über die Signaturen der behaltenen Chunks; ids sind ihre Reihenfolge."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.rows = NUM_PERM // BANDS
+        self._buckets = [{} for _ in range(BANDS)]
+        self._signatures = []
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, signature):
+        for band in range(BANDS):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def find(self, signature):
+        """Id des ähnlichsten behaltenen Chunks ab threshold, sonst None."""
+        candidates = set()
+        for band, key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+        best, best_similarity = None, self.threshold
+        for i in candidates:
+            similarity = float(np.mean(self._signatures[i] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = i, similarity
+        return best
+
+    def add(self, signature):
+        i = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in self._band_keys(signature):
+            self._buckets[band].setdefault(key, []).append(i)
+        return i
@@ -1,12 +1,19 @@
+import json
 import os
 import re
+import resource
+import sys
+import time
 import fitz
 from pathlib import Path
-from bs4 import BeautifulSoup
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_community.vectorstores import FAISS
+from html import escape
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+import faiss
+import numpy as np
 from sentence_transformers import SentenceTransformer
-from langchain_community.embeddings import SentenceTransformerEmbeddings
+from app.services.compact_store import CompactStoreWriter, is_compact_store
+from app.services.index_versions import VERSIONS_DIR, new_version_path, publish_version
+from vector.dedup import NUM_PERM, SHINGLE_WORDS, NearDuplicateIndex, minhash
 from dotenv import load_dotenv
 
 load_dotenv()  # .env laden
@@ -15,120 +22,139 @@ PDF_DIR = "./app/data/pdfs"
 HTML_DIR = "../ui/public/contracts"
 FAISS_INDEX_PATH = "./app/data/vectorstore_index"
 
-def pdf_to_html(html_title, pdf_path, html_path, out_dir):
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Trennstellen der Chunks in absteigender Priorität: Absatz, Satz, Wort
+CHUNK_SEPARATORS = ["\n", ". ", " ", ""]
+# Chunks pro Encoder-Aufruf; bestimmt zusammen mit der Chunkgrösse den Speicherbedarf
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+# Vektoren pro index.add()-Aufruf beim Abschluss
+INDEX_ADD_BATCH_SIZE = 65536
+# Fortschritt eines laufenden Builds und die bisherigen Embeddings (float32, roh)
+CHECKPOINT_FILE = "build_checkpoint.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+SIGNATURES_FILE = "minhash.u32"
+# Ab dieser geschätzten Jaccard-Ähnlichkeit gilt ein Chunk als Duplikat (0 = keine Deduplizierung)
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+# Verarbeitungsreihenfolge: bei Duplikaten wird die zuerst gesehene Stelle zur
+# Hauptquelle, deshalb kommen die Vertragstexte vor den Erläuterungen
+CATEGORY_ORDER = ["abkommen", "umsetzung", "bericht", "faktenblatt", "faq", "uebersicht"]
+
+HELP_ICON_PATH = "M140,180a12,12,0,1,1-12-12A12,12,0,0,1,140,180ZM128,72c-22.06,0-40,16.15-40,36v4a8,8,0,0,0,16,0v-4c0-11,10.77-20,24-20s24,9,24,20-10.77,20-24,20a8,8,0,0,0-8,8v8a8,8,0,0,0,16,0v-.72c18.24-3.35,32-17.9,32-35.28C168,88.15,150.06,72,128,72Zm104,56A104,104,0,1,1,128,24,104.11,104.11,0,0,1,232,128Zm-16,0a88,88,0,1,0-88,88A88.1,88.1,0,0,0,216,128Z"
+ASK_ICON_PATH = "M216,48H40A16,16,0,0,0,24,64V224a15.84,15.84,0,0,0,9.25,14.5A16.05,16.05,0,0,0,40,240a15.89,15.89,0,0,0,10.25-3.78l.09-.07L83,208H216a16,16,0,0,0,16-16V64A16,16,0,0,0,216,48ZM40,224h0ZM216,192H80a8,8,0,0,0-5.23,1.95L40,224V64H216Z"
+
+# Wörter, vor denen ein Bindestrich am Zeilenende ein Ergänzungsstrich ist ("Personen- und")
+KEEP_HYPHEN_BEFORE = {"und", "oder", "bzw.", "sowie", "bis"}
+
+def html_head(html_title):
+    """Statischer Seitenkopf inkl. Header, Hilfe- und Frage-Button bis zum Text-Container."""
+    return (
+        "<!DOCTYPE html>\n"
+        "<html><head><meta charset=\"utf-8\"/>"
+        f"<title>{escape(html_title)}</title>"
+        "<meta content=\"width=device-width, initial-scale=1\" name=\"viewport\"/>"
+        "<link href=\"/static.css\" rel=\"stylesheet\"/></head><body>"
+        "<div class=\"ask-button-container\"><a href=\"/\">"
+        "<svg fill=\"currentColor\" height=\"26\" viewBox=\"0 0 256 256\" width=\"26\" xmlns=\"http://www.w3.org/2000/svg\">"
+        f"<path d=\"{ASK_ICON_PATH}\"></path></svg>"
+        "<div>Stelle deine eigenen Fragen</div></a></div>"
+        "<div class=\"header\"><a class=\"logo\" href=\"/\">"
+        "<img alt=\"Logo\" height=\"28\" src=\"/logo-colored.webp\" width=\"28\"/>"
+        "<div>Rahmenabkommen GPT</div></a>"
+        "<a class=\"help-button\" dataDiscover=\"true\" href=\"/help\">"
+        "<svg fill=\"currentColor\" height=\"26\" viewBox=\"0 0 256 256\" width=\"26\" xmlns=\"http://www.w3.org/2000/svg\">"
+        f"<path d=\"{HELP_ICON_PATH}\"></path></svg></a></div>"
+        "<div class=\"text-container\">\n"
+    )
+
+def tag_for_size(size):
+    # Schwellen für Überschriften (anpassen!)
+    if size >= 16:
+        return "h1"
+    if size >= 12:
+        return "h2"
+    return "p"
+
+def join_lines(parts):
+    """Fügt Zeilen zusammen und entfernt Trennstriche am Zeilenende ("Verlagerungs-" + "politik")."""
+    text = ""
+    for part in parts:
+        if not text:
+            text = part
+        elif text.endswith("-") and part[:1].islower() and part.split(" ", 1)[0] not in KEEP_HYPHEN_BEFORE:
+            text = text[:-1] + part
+        else:
+            text += " " + part
+    return text
+
+def merge_block_spans(block):
+    """
+    Fasst aufeinanderfolgende Spans eines Textblocks mit gleichem Stil (h1/h2/p)
+    zu einem Absatz zusammen. Liefert eine Liste von (tag_name, text).
     """
-    Liest ein PDF mit PyMuPDF, erkennt anhand der font_size Überschriften vs. Fließtext
-    und schreibt ein HTML-Dokument mit <h1>, <h2> und <p> Elementen.
+    elements = []
+    current_tag = None
+    current_lines = []
+    for line in block["lines"]:
+        for span in line["spans"]:
+            text = span["text"].strip()
+            if not text:
+                continue
+            tag_name = tag_for_size(span["size"])
+            if tag_name != current_tag and current_lines:
+                elements.append((current_tag, join_lines(current_lines)))
+                current_lines = []
+            current_tag = tag_name
+            current_lines.append(text)
+    if current_lines:
+        elements.append((current_tag, join_lines(current_lines)))
+    return elements
+
+def render_pdf(html_title, pdf_path, html_path, out_dir):
+    """
+    Liest ein PDF mit PyMuPDF und schreibt das HTML-Dokument seitenweise direkt in
+    die Datei, ohne einen Dokumentbaum im Speicher aufzubauen. Überschriften vs.
+    Fließtext werden anhand der font_size erkannt; Spans gleichen Stils innerhalb
+    eines Textblocks werden zu einem Absatz zusammengefasst.
+
+    Im selben Durchgang werden der Klartext und das Mapping
+    (start, end, element_id) für die Quellenangaben erzeugt.
     """
-    doc = fitz.open(pdf_path)
-    html = BeautifulSoup(
-        f"<!DOCTYPE html><html><head>"
-        f"<meta charset='utf-8'><title>{html_title}</title>"
-        f"<meta name='viewport' content='width=device-width, initial-scale=1'>"
-        f"<link rel='stylesheet' href='/static.css'>"
-        "</head><body></body></html>",
-        "html.parser"
-    )    
-
-    body = html.body
-
-    text_container = html.new_tag("div", **{"class": "text-container"})
-
-    # Header-Container
-    header = html.new_tag("div", **{"class": "header"})
-    # Logo-Link
-    logo = html.new_tag("a", href="/", **{"class": "logo"})
-    img = html.new_tag("img", src="/logo-colored.webp", alt="Logo", width="28", height="28")
-    title = html.new_tag("div"); title.string = "Rahmenabkommen GPT"
-    logo.append(img); logo.append(title)
-    header.append(logo)
-
-    # Help icon
-    help = html.new_tag('a', href="/help", dataDiscover="true", **{"class": "help-button"})
-    help_icon = html.new_tag('svg', xmlns="http://www.w3.org/2000/svg", width="26", height="26", fill="currentColor", viewBox="0 0 256 256")
-    help_icon_path = html.new_tag('path', d="M140,180a12,12,0,1,1-12-12A12,12,0,0,1,140,180ZM128,72c-22.06,0-40,16.15-40,36v4a8,8,0,0,0,16,0v-4c0-11,10.77-20,24-20s24,9,24,20-10.77,20-24,20a8,8,0,0,0-8,8v8a8,8,0,0,0,16,0v-.72c18.24-3.35,32-17.9,32-35.28C168,88.15,150.06,72,128,72Zm104,56A104,104,0,1,1,128,24,104.11,104.11,0,0,1,232,128Zm-16,0a88,88,0,1,0-88,88A88.1,88.1,0,0,0,216,128Z")
-    help_icon.append(help_icon_path)
-    help.append(help_icon)
-    header.append(help)
-
-    ask_container = html.new_tag("div", **{"class": "ask-button-container"})
-    ask_button = html.new_tag("a", href="/"); 
-    ask_text = html.new_tag("div"); ask_text.string = "Stelle deine eigenen Fragen"
-    ask_icon = html.new_tag('svg', xmlns="http://www.w3.org/2000/svg", width="26", height="26", fill="currentColor", viewBox="0 0 256 256")
-    ask_icon_path = html.new_tag('path', d="M216,48H40A16,16,0,0,0,24,64V224a15.84,15.84,0,0,0,9.25,14.5A16.05,16.05,0,0,0,40,240a15.89,15.89,0,0,0,10.25-3.78l.09-.07L83,208H216a16,16,0,0,0,16-16V64A16,16,0,0,0,216,48ZM40,224h0ZM216,192H80a8,8,0,0,0-5.23,1.95L40,224V64H216Z")
-
-    ask_icon.append(ask_icon_path)
-    ask_button.append(ask_icon)
-    ask_button.append(ask_text)
-    ask_container.append(ask_button)
-    body.append(ask_container)
-
-    # Dark-Mode-Button
-    #dm_btn = html.new_tag("button", **{"aria-label": "Toggle dark mode" })
-    #dm_btn.append(BeautifulSoup(darkmode_svg, "html.parser"))
-    #header.append(dm_btn)
-
-    body.append(header)    
-    body.append(text_container)    
-    # ID-Counter für Referenzen
-    counters = {"h1": 0, "h2": 0, "p": 0}
-
-    for page_num, page in enumerate(doc, start=1):
-        # Optional: Kapitel-Header pro Seite
-        page_header = html.new_tag("h2")
-        counters["h2"] += 1
-        if not page_header.get('id'):
-            page_header['id'] = f"h{counters['h2']}"
-        text_container.append(page_header)
-
-        # Textblöcke im „dict“-Format
-        page_dict = page.get_text("dict")
-        for block in page_dict["blocks"]:
-            if block["type"] != 0: 
-                continue  # nur Text-Blöcke
-
-            for line in block["lines"]:
-                for span in line["spans"]:
-                    text = span["text"].strip()
-                    if not text:
-                        continue
-                    size = span["size"]
-                    # Schwellen für Überschriften (anpassen!)
-                    if size >= 16:
-                        tag_name = "h1"
-                    elif size >= 12:
-                        tag_name = "h2"
-                    else:
-                        tag_name = "p"
-                    tag = html.new_tag(tag_name)
-                    tag.string = text
-                    # ID hinzufügen, wenn nicht vorhanden
-                    if not tag.get('id'):
-                        counters[tag_name] += 1
-                        tag['id'] = f"p{counters[tag_name]}"
-
-                    text_container.append(tag)
-
-    # Schreibe die Datei
     out_path = os.path.join(out_dir, html_path)
     os.makedirs(out_dir, exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write(str(html))
-    print(f"[HTML] {pdf_path} → {out_path}")
-    return html
+    tmp_path = out_path + ".tmp"
 
-def extract_text_with_mapping(soup):
-    text = ""
+    text_parts = []
     mapping = []
     current_pos = 0
+    element_count = 0
 
-    for element in soup.find_all(['span', 'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-        element_text = element.get_text()
-        start = current_pos
-        end = start + len(element_text)
-        mapping.append((start, end, element['id']))
-        text += element_text + "\n"
-        current_pos = end + 1  # +1 für die neue Zeile
+    with fitz.open(pdf_path) as doc, open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(html_head(html_title))
+        for page_num, page in enumerate(doc, start=1):
+            # Seitenanker
+            f.write(f'<h2 id="h{page_num}"></h2>\n')
+
+            # Textblöcke im „dict“-Format
+            for block in page.get_text("dict")["blocks"]:
+                if block["type"] != 0:
+                    continue  # nur Text-Blöcke
+                for tag_name, text in merge_block_spans(block):
+                    element_count += 1
+                    element_id = f"p{element_count}"
+                    f.write(f'<{tag_name} id="{element_id}">{escape(text, quote=False)}</{tag_name}>\n')
+
+                    mapping.append((current_pos, current_pos + len(text), element_id))
+                    text_parts.append(text)
+                    current_pos += len(text) + 1  # +1 für die neue Zeile
+        f.write("</div></body></html>\n")
+
+    # Erst nach vollständigem Schreiben ersetzen, damit nie eine halbe Seite ausgeliefert wird
+    os.replace(tmp_path, out_path)
+    print(f"[HTML] {pdf_path} → {out_path}")
+
+    text = "".join(part + "\n" for part in text_parts)
     return text, mapping
 
 def get_chunk_positions(text, chunks, overlap=200):
@@ -166,68 +192,241 @@ def make_html_title(filename: str) -> str:
     base = base.strip('_')
     return base
 
+def classify_document(filename: str) -> str:
+    """
+    Ordnet ein Dokument anhand des Dateinamens einer Kategorie zu (für
+    eingeschränkte Suchen, z.B. nur Abkommen ohne Erläuterungen):
+    abkommen, umsetzung, bericht, faktenblatt, faq, uebersicht
+    """
+    name = os.path.basename(filename)
+    if "Faktenblatt" in name:
+        return "faktenblatt"
+    if "FAQ" in name:
+        return "faq"
+    if "Erläuternder Bericht" in name or "Erläuternder_Bericht" in name:
+        return "bericht"
+    if name.startswith("Übersicht"):
+        return "uebersicht"
+    if re.match(r"^\d+\.\s*BB\b", name):
+        # Bundesbeschlüsse der innerstaatlichen Umsetzung
+        return "umsetzung"
+    return "abkommen"
+
+def iter_pdf_chunks(pdf_path, html_dir):
+    """Rendert ein PDF nach HTML und liefert (Chunk, Metadaten) nacheinander."""
+    # HTML Dateiname und Titel erzeugen
+    html_title = make_html_title(pdf_path)
+    html_path = make_html_path(pdf_path)
+    document = os.path.splitext(html_path)[0]
+    category = classify_document(pdf_path)
+
+    # PDF in HTML umwandeln, dabei Text extrahieren und Mapping erstellen
+    text, mapping = render_pdf(html_title, pdf_path, html_path, html_dir)
+    print(f"Länge des extrahierten Textes: {len(text)} Zeichen")
+
+    # Text in Chunks aufteilen: bevorzugt an Absatzgrenzen; ein Absatz über
+    # CHUNK_SIZE (ganzer PDF-Textblock) wird an Satz- bzw. Wortgrenzen geteilt
+    splitter = RecursiveCharacterTextSplitter(
+        separators=CHUNK_SEPARATORS,
+        keep_separator="end",
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len
+    )
+    chunks = splitter.split_text(text)
+    print(f"Anzahl Chunks für dieses PDF: {len(chunks)}")
+
+    # Startpositionen der Chunks ermitteln
+    positions = get_chunk_positions(text, chunks, CHUNK_OVERLAP)
+
+    # Metadaten für jeden Chunk erstellen
+    for chunk, start_pos in zip(chunks, positions):
+        for map_start, map_end, element_id in mapping:
+            if map_start <= start_pos < map_end:
+                yield chunk, {
+                    "source": f"/contracts/{html_path}#{element_id}",
+                    "document": document,
+                    "category": category,
+                }
+                break
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def build_settings():
+    # Ein Checkpoint passt nur zu einem Build mit denselben Einstellungen
+    return {
+        "model": EMBEDDING_MODEL, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+        "chunk_separators": CHUNK_SEPARATORS,
+        "dedup_threshold": DEDUP_THRESHOLD, "num_perm": NUM_PERM, "shingle_words": SHINGLE_WORDS,
+    }
+
+def load_checkpoint(output_path):
+    try:
+        with open(os.path.join(output_path, CHECKPOINT_FILE), encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get("settings") != build_settings():
+        print("⚠️ Checkpoint mit anderen Einstellungen, Build beginnt von vorne")
+        return None
+    return checkpoint
+
+def save_checkpoint(output_path, checkpoint):
+    tmp_path = os.path.join(output_path, CHECKPOINT_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(output_path, CHECKPOINT_FILE))
+
+def build_faiss_index(embeddings_path, count, dim):
+    # FAISS-Index (L2, wie FAISS.from_embeddings) blockweise aus der Embedding-Datei füllen
+    index = faiss.IndexFlatL2(dim)
+    if count:
+        vectors = np.memmap(embeddings_path, dtype=np.float32, mode="r", shape=(count, dim))
+        for start in range(0, count, INDEX_ADD_BATCH_SIZE):
+            index.add(np.ascontiguousarray(vectors[start:start + INDEX_ADD_BATCH_SIZE]))
+        del vectors
+    return index
+
+def drop_near_duplicates(chunks, dedup, writer, signatures_file):
+    """
+    Lässt nur Chunks durch, die keinem bereits behaltenen Chunk nahezu gleichen.
+    Duplikate werden als alternative Quelle des behaltenen Chunks gespeichert.
+    """
+    for chunk, metadata in chunks:
+        signature = minhash(chunk)
+        duplicate_of = dedup.find(signature)
+        if duplicate_of is not None:
+            writer.add_alternative(duplicate_of, metadata)
+            continue
+        dedup.add(signature)
+        signatures_file.write(signature.tobytes())
+        yield chunk, metadata
+
+def directory_size_mb(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 1024 / 1024
+
+def peak_rss_mb():
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / 1024 if sys.platform == "darwin" else maxrss / 1024
+
 def build_and_save_vectorstore(pdf_dir, html_dir, output_path):
-    pdf_paths = [os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.endswith(".pdf")]
+    """
+    Baut den Vectorstore, ohne alle Chunks oder Embeddings im Speicher zu halten:
+    Chunks werden pro PDF erzeugt, in Batches von EMBED_BATCH_SIZE eingebettet und
+    sofort an den kompakten Docstore und die Embedding-Datei angehängt.
+
+    Nahezu identische Chunks (DEDUP_THRESHOLD) werden nur einmal eingebettet; die
+    weiteren Fundstellen bleiben als alternative Quellen für die Fussnoten erhalten.
+
+    Nach jedem PDF wird ein Checkpoint geschrieben. Ein abgebrochener Build setzt
+    beim nächsten Aufruf mit demselben output_path nach dem letzten fertigen PDF fort.
+    """
+    started = time.perf_counter()
+    pdf_paths = sorted(
+        (os.path.join(pdf_dir, f) for f in os.listdir(pdf_dir) if f.endswith(".pdf")),
+        key=lambda p: (CATEGORY_ORDER.index(classify_document(p)), os.path.basename(p)),
+    )
     print(f"PDFs gefunden: {len(pdf_paths)}")
-    
-    all_chunk_texts = []
-    all_metadatas = []
-    
+
     os.makedirs(html_dir, exist_ok=True)
-    
+    os.makedirs(output_path, exist_ok=True)
+
+    checkpoint = load_checkpoint(output_path) or {"settings": build_settings(), "pdfs_done": [], "store": {}}
+    done = set(checkpoint["pdfs_done"])
+    if done:
+        print(f"Setze Build fort: {len(done)} PDFs, {checkpoint['store']['count']} Chunks bereits fertig")
+
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    dim = model.get_sentence_embedding_dimension()
+    writer = CompactStoreWriter(output_path, checkpoint["store"])
+    embeddings_path = os.path.join(output_path, EMBEDDINGS_FILE)
+    embeddings_file = open(embeddings_path, "ab")
+    # Alles nach dem letzten Checkpoint verwerfen
+    embeddings_file.truncate(writer.count * dim * 4)
+
+    dedup = NearDuplicateIndex(DEDUP_THRESHOLD)
+    signatures_path = os.path.join(output_path, SIGNATURES_FILE)
+    signatures_file = open(signatures_path, "ab")
+    signatures_file.truncate(writer.count * NUM_PERM * 4 if DEDUP_THRESHOLD > 0 else 0)
+    if DEDUP_THRESHOLD > 0 and writer.count:
+        for signature in np.fromfile(signatures_path, dtype=np.uint32).reshape(-1, NUM_PERM):
+            dedup.add(signature)
+
     for pdf_path in pdf_paths:
+        name = os.path.basename(pdf_path)
+        if name in done:
+            continue
         print(f"\n{'='*50}")
-        print(f"Verarbeite PDF: {os.path.basename(pdf_path)}")
+        print(f"Verarbeite PDF: {name}")
         print(f"{'='*50}\n")
-        
-        # HTML Dateiname und Titel erzeugen
-        html_title = make_html_title(pdf_path)
-        html_path = make_html_path(pdf_path)
-
-        # PDF in HTML umwandeln
-        soup = pdf_to_html(html_title, pdf_path, html_path, html_dir)
-        
-        # Text extrahieren und Mapping erstellen
-        text, mapping = extract_text_with_mapping(soup)
-        print(f"Länge des extrahierten Textes: {len(text)} Zeichen")
-        
-        # Text in Chunks aufteilen
-        splitter = CharacterTextSplitter(
-            separator="\n",
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
-        )
-        chunks = splitter.split_text(text)
-        print(f"Anzahl Chunks für dieses PDF: {len(chunks)}")
-        
-        # Startpositionen der Chunks ermitteln
-        positions = get_chunk_positions(text, chunks)
-        
-        # Metadaten für jeden Chunk erstellen
-        for chunk, start_pos in zip(chunks, positions):
-            for map_start, map_end, element_id in mapping:
-                if map_start <= start_pos < map_end:
-                    metadata = {"source": f"/contracts/{html_path}#{element_id}"}
-                    all_chunk_texts.append(chunk)
-                    all_metadatas.append(metadata)
-                    break
-    
-    print(f"\nAnzahl Chunks insgesamt: {len(all_chunk_texts)}")
-    
-    # Alle Chunks einbetten
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    embedding_model = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-    all_embeddings = model.encode(all_chunk_texts, show_progress_bar=True, convert_to_numpy=True)
-    
-    # Vektorspeicher mit Metadaten erstellen und speichern
-    vectorstore = FAISS.from_embeddings(
-        list(zip(all_chunk_texts, all_embeddings)),
-        embedding_model,
-        metadatas=all_metadatas
-    )
-    vectorstore.save_local(output_path)
-    print(f"✅ Vectorstore gespeichert unter: {output_path}")
+
+        chunks = iter_pdf_chunks(pdf_path, html_dir)
+        if DEDUP_THRESHOLD > 0:
+            chunks = drop_near_duplicates(chunks, dedup, writer, signatures_file)
+        for batch in batched(chunks, EMBED_BATCH_SIZE):
+            texts = [chunk for chunk, _ in batch]
+            vectors = model.encode(texts, batch_size=EMBED_BATCH_SIZE, convert_to_numpy=True)
+            embeddings_file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            for chunk, metadata in batch:
+                writer.add(chunk, metadata)
+
+        for f in (embeddings_file, signatures_file):
+            f.flush()
+            os.fsync(f.fileno())
+        checkpoint["store"] = writer.state()
+        checkpoint["pdfs_done"].append(name)
+        save_checkpoint(output_path, checkpoint)
+        print(f"Chunks bisher: {writer.count}, Duplikate: {writer.alternatives}, Peak-RSS: {peak_rss_mb():.0f} MB")
+
+    embeddings_file.close()
+    signatures_file.close()
+    total = writer.count + writer.alternatives
+    print(f"\nAnzahl Chunks insgesamt: {total}")
+    if total:
+        print(f"Duplikate zusammengeführt: {writer.alternatives} ({writer.alternatives / total:.1%}), "
+              f"Vektoren im Index: {writer.count}")
+
+    # FAISS-Index und kompakten Docstore abschliessen
+    index = build_faiss_index(embeddings_path, writer.count, dim)
+    writer.close(index)
+    # Zuerst den Checkpoint entfernen: ab hier darf der Build nicht mehr fortgesetzt
+    # werden, sonst würden die .part-Dateien mit Nullen neu angelegt
+    os.remove(os.path.join(output_path, CHECKPOINT_FILE))
+    os.remove(embeddings_path)
+    os.remove(signatures_path)
+    print(f"✅ Vectorstore gespeichert unter: {output_path} ({directory_size_mb(output_path):.1f} MB)")
+    print(f"Dauer: {time.perf_counter() - started:.1f} s, Peak-RSS: {peak_rss_mb():.0f} MB")
+
+def find_unfinished_version(index_root):
+    """Liefert (Version, Pfad) eines abgebrochenen Builds, falls die neueste Version einer ist."""
+    versions_dir = os.path.join(index_root, VERSIONS_DIR)
+    versions = sorted(os.listdir(versions_dir)) if os.path.isdir(versions_dir) else []
+    if not versions:
+        return None
+    path = os.path.join(versions_dir, versions[-1])
+    # Mit meta.json ist der Docstore bereits abgeschlossen und nicht mehr fortsetzbar
+    if os.path.exists(os.path.join(path, CHECKPOINT_FILE)) and not is_compact_store(path):
+        return versions[-1], path
+    return None
+
+def build_and_publish_version(pdf_dir, html_dir, index_root):
+    # Neue Version in eigenes Verzeichnis schreiben und erst danach aktivieren,
+    # laufende Server wechseln dann ohne Neustart (siehe app/services/index_versions.py)
+    unfinished = find_unfinished_version(index_root)
+    version, version_path = unfinished or new_version_path(index_root)
+    build_and_save_vectorstore(pdf_dir, html_dir, version_path)
+    publish_version(index_root, version)
+    print(f"✅ Version {version} aktiviert")
 
 if __name__ == "__main__":
-    build_and_save_vectorstore(PDF_DIR, HTML_DIR, FAISS_INDEX_PATH)
+    build_and_publish_version(PDF_DIR, HTML_DIR, FAISS_INDEX_PATH)